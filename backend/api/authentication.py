@@ -0,0 +1,87 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from foodgram.caching import LRUCache
+from foodgram_backend.db.replicas import use_primary
+
+User = get_user_model()
+
+CACHE_KEY = 'auth_token:{}'
+# Формат ключей Token.generate_key: 20 случайных байт в hex.
+TOKEN_KEY_PATTERN = re.compile(r'[0-9a-f]{40}')
+# Поля пользователя, которые читает API, в порядке полей модели;
+# остальные (например, пароль) загружаются отложенно при обращении.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'email', 'username', 'first_name',
+                         'last_name', 'avatar', 'is_active', 'is_staff',
+                         'is_superuser')
+)
+
+local_cache = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE,
+                       settings.AUTH_TOKEN_CACHE_TTL)
+
+
+def get_user_values(key, use_cache=True):
+    """Значения USER_FIELDS владельца токена key или None.
+
+    Без use_cache значения читаются из основной базы.
+    """
+    if not use_cache:
+        # Только что выданный токен может ещё не дойти до реплики.
+        with use_primary():
+            return User.objects.filter(auth_token__key=key).values_list(
+                *USER_FIELDS
+            ).first()
+    values = local_cache.get(key)
+    if values is not None:
+        return values
+    values = cache.get(CACHE_KEY.format(key))
+    if values is None:
+        values = get_user_values(key, use_cache=False)
+        if values is None:
+            return None
+        cache.set(CACHE_KEY.format(key), values,
+                  settings.AUTH_TOKEN_CACHE_TIMEOUT)
+    local_cache.set(key, values)
+    return values
+
+
+def forget(key):
+    """Удаляет токен из кэшей: выход, смена пароля, деактивация."""
+    local_cache.delete(key)
+    cache.delete(CACHE_KEY.format(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый запрос.
+
+    Пользователь собирается из закэшированных значений USER_FIELDS.
+    Сигналы удаления токена и сохранения пользователя сбрасывают кэши
+    сразу; в других процессах запись в кэше процесса живёт не дольше
+    AUTH_TOKEN_CACHE_TTL, общий кэш - AUTH_TOKEN_CACHE_TIMEOUT.
+    """
+    use_cache = True
+
+    def authenticate_credentials(self, key):
+        # Ключ другого формата не попадает в кэш: memcached не принимает
+        # ключи с управляющими символами и длиннее 250 символов.
+        if not TOKEN_KEY_PATTERN.fullmatch(key):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        values = get_user_values(key, self.use_cache)
+        if values is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        user = User.from_db(router.db_for_write(User), USER_FIELDS, values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return user, Token(key=key, user=user)
@@ -1,14 +1,181 @@
 import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+from foodgram.image_variants import variant_names, variants_ready
+
+BASE64_MARKER = ';base64,'
+# Длина фрагмента base64 кратна 4: каждый фрагмент декодируется отдельно.
+CHUNK_SIZE = 64 * 1024
+
+
+def sniff_format(header):
+    """Формат изображения по сигнатуре первых байтов или None."""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
 
 class Base64ImageField(serializers.ImageField):
-    """Обработка изображений в формате base64."""
+    """Обработка изображений в формате base64.
+
+    Строка декодируется фрагментами во временный файл, который хранится
+    в памяти, пока не превысит FILE_UPLOAD_MAX_MEMORY_SIZE. Размер
+    проверяется до декодирования, формат - по первому фрагменту.
+    """
+    default_error_messages = {
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'unsupported_format': ('Поддерживаются изображения JPEG, PNG, GIF '
+                               'и WebP.'),
+    }
+
+    def __init__(self, *args, max_size=None, **kwargs):
+        self.max_size = max_size or settings.IMAGE_UPLOAD_MAX_SIZE
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if not (isinstance(data, str) and data.startswith('data:image')):
+            return super().to_internal_value(data)
+        start = data.find(BASE64_MARKER)
+        if start == -1:
+            self.fail('invalid_image')
+        # base64 часто переносят по 76 символов: пробельные символы
+        # убираются до проверки длины и разбиения на фрагменты.
+        payload = ''.join(data[start + len(BASE64_MARKER):].split())
+        if len(payload) % 4:
+            self.fail('invalid_image')
+        size = (len(payload) // 4 * 3
+                - payload.endswith('=') - payload.endswith('=='))
+        if size > self.max_size:
+            self.fail('too_large', max_size=self.max_size)
+
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            image_format = self.decode(payload, file)
+            image = UploadedFile(
+                file, name=f'temp.{image_format}',
+                content_type=f'image/{image_format}', size=size
+            )
+            serializers.FileField.to_internal_value(self, image)
+            self.verify(image)
+        except Exception:
+            file.close()
+            raise
+        return image
+
+    def decode(self, payload, file):
+        """Записывает декодированные байты в file, возвращает формат."""
+        image_format = None
+        try:
+            for offset in range(0, len(payload), CHUNK_SIZE):
+                chunk = base64.b64decode(payload[offset:offset + CHUNK_SIZE],
+                                         validate=True)
+                if image_format is None:
+                    image_format = sniff_format(chunk)
+                    if image_format is None:
+                        self.fail('unsupported_format')
+                file.write(chunk)
+        except binascii.Error:
+            self.fail('invalid_image')
+        if image_format is None:
+            self.fail('invalid_image')
+        file.seek(0)
+        return image_format
+
+    def verify(self, image):
+        """Проверка Pillow без копирования файла в память."""
+        try:
+            with Image.open(image) as opened:
+                opened.verify()
+        except Exception:
+            self.fail('invalid_image')
+        image.seek(0)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии изображения: {вариант: url}.
+
+    Пока варианты не созданы, все ссылки ведут на оригинал.
+    """
+
+    def __init__(self, variants, **kwargs):
+        self.variants = variants
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        paths = variant_names(value.name, self.variants)
+        if not variants_ready(value.name, self.variants, value.storage):
+            paths = dict.fromkeys(paths, value.name)
+        urls = {}
+        for key, path in paths.items():
+            url = value.storage.url(path)
+            urls[key] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+def prefetch_pks(serializer, queryset, values):
+    """Загружает объекты по первичным ключам values одним IN-запросом.
+
+    Поля PrefetchedPrimaryKeyRelatedField этого сериализатора берут
+    объекты из загруженного словаря. Некорректные значения
+    пропускаются: их отклонит само поле.
+    """
+    pk_field = queryset.model._meta.pk
+    pks = set()
+    for value in values:
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            pks.add(pk_field.to_python(value))
+        except DjangoValidationError:
+            continue
+    if not hasattr(serializer, 'prefetched_pks'):
+        serializer.prefetched_pks = {}
+    serializer.prefetched_pks[queryset.model] = queryset.only(
+        'pk'
+    ).in_bulk(pks)
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField без запроса на каждое значение.
+
+    Если корневой сериализатор заранее загрузил объекты через
+    prefetch_pks, они берутся из словаря; ошибки те же, что у
+    PrimaryKeyRelatedField.
+    """
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        queryset = self.get_queryset()
+        objects = getattr(self.root, 'prefetched_pks', {}).get(
+            queryset.model
+        )
+        if objects is None:
+            return super().to_internal_value(data)
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            pk = queryset.model._meta.pk.to_python(data)
+        except (TypeError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in objects:
+            self.fail('does_not_exist', pk_value=data)
+        return objects[pk]
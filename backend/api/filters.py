@@ -1,31 +1,71 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from foodgram.models import Ingredient, Recipe, Tag
+from foodgram.models import Favorites, Ingredient, Recipe, ShoppingList
+from foodgram.search import search_recipes
+from foodgram.tag_slugs import get_tag_ids
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
+    # Слаги проверяются по кэшу тегов, а не запросом к таблице.
+    tags = filters.MultipleChoiceFilter(choices=tag_choices,
+                                        method='filter_tags')
+    # any - рецепты хотя бы с одним из тегов, all - со всеми тегами.
+    tags_match = filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')), method='filter_noop'
     )
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    # Полнотекстовый поиск по названию и описанию.
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
 
+    def filter_tags(self, queryset, name, value):
+        """Подзапросы EXISTS вместо JOIN: рецепты не повторяются,
+        а порядок ленты по-прежнему берётся из индекса."""
+        tag_ids = get_tag_ids()
+        tag_ids = [tag_ids[slug] for slug in value if slug in tag_ids]
+        through = Recipe.tags.through.objects
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            for tag_id in tag_ids:
+                queryset = queryset.filter(Exists(through.filter(
+                    recipe=OuterRef('pk'), tag_id=tag_id
+                )))
+            return queryset
+        return queryset.filter(Exists(through.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids
+        )))
+
+    def filter_noop(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """По релевантности; в курсорном режиме порядок ленты задаёт
+        пагинация."""
+        return search_recipes(queryset, value,
+                              ranked='cursor' not in self.data)
+
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(Exists(Favorites.objects.filter(
+                user=self.request.user, favorites=OuterRef('pk')
+            )))
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(carts__user=self.request.user)
+            return queryset.filter(Exists(ShoppingList.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
 
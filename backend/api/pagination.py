@@ -1,5 +1,105 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class PagePagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipePagination(PagePagination):
+    """Пагинация рецептов по номерам страниц или по курсору.
+
+    Курсорный режим включается параметром cursor (пустым для первой
+    страницы). Страница выбирается по ключу (pub_date, id) без COUNT(*)
+    и OFFSET, поэтому дальние страницы не медленнее первых.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'pk')
+            if position:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=position[0])
+                    | Q(pub_date=position[0], pk__gt=position[1])
+                )
+        else:
+            queryset = queryset.order_by('-pub_date', '-pk')
+            if position:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=position[0])
+                    | Q(pub_date=position[0], pk__lt=position[1])
+                )
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def decode_cursor(self, request):
+        """Позиция (pub_date, id) и направление из параметра cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            pub_date, pk, reverse = urlsafe_b64decode(
+                encoded.encode()
+            ).decode().split('|')
+            return (datetime.fromisoformat(pub_date), int(pk)), bool(
+                int(reverse)
+            )
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe, reverse):
+        cursor = f'{recipe.pub_date.isoformat()}|{recipe.pk}|{int(reverse)}'
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            urlsafe_b64encode(cursor.encode()).decode()
+        )
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return replace_query_param(self.request.build_absolute_uri(),
+                                       self.cursor_query_param, '')
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
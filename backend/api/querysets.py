@@ -0,0 +1,50 @@
+from django.db.models import (BooleanField, Count, Exists, OuterRef, Prefetch,
+                              Value, prefetch_related_objects)
+
+from foodgram.models import Recipe
+from users.models import Subscriptions
+
+
+def annotate_is_subscribed(queryset, user):
+    """Аннотирует пользователей флагом подписки текущего пользователя."""
+    if not user.is_authenticated:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(is_subscribed=Exists(
+        Subscriptions.objects.filter(user=user, following=OuterRef('pk'))
+    ))
+
+
+def annotate_subscriptions(queryset, user):
+    """Аннотирует авторов числом рецептов и флагом подписки."""
+    return annotate_is_subscribed(
+        queryset.annotate(recipes_count=Count('recipes', distinct=True)),
+        user
+    ).order_by('email', 'pk')
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он некорректен."""
+    try:
+        recipes_limit = int(request.GET.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
+
+
+def prefetch_limited_recipes(authors, recipes_limit=None):
+    """Загружает последние рецепты всех авторов одним запросом.
+
+    Результат сохраняется в атрибуте limited_recipes каждого автора.
+    """
+    authors = list(authors)
+    queryset = Recipe.objects.filter(author__in=authors)
+    if recipes_limit is not None:
+        queryset = queryset.first_per_author(recipes_limit)
+    prefetch_related_objects(authors, Prefetch(
+        'recipes',
+        queryset=queryset.order_by('-pub_date', '-pk'),
+        to_attr='limited_recipes'
+    ))
+    return authors
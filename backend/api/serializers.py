@@ -1,13 +1,18 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework.validators import UniqueTogetherValidator
 
+from foodgram.image_variants import AVATAR_VARIANTS, RECIPE_VARIANTS
 from foodgram.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
-                             ShoppingList, Tag)
-from api.fields import Base64ImageField
+                             ShoppingList, ShoppingListIngredient, Tag)
+from foodgram.recipe_index import recipe_index
+from api.fields import (Base64ImageField, ImageVariantsField,
+                        PrefetchedPrimaryKeyRelatedField, prefetch_pks)
+from api.querysets import (annotate_subscriptions, get_recipes_limit,
+                           prefetch_limited_recipes)
 from users.models import Subscriptions
 
 User = get_user_model()
@@ -17,13 +22,16 @@ class UserInfoSerializer(UserSerializer):
     """Сериализатор для получения информации о пользователе."""
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False, allow_null=True)
+    avatar_variants = ImageVariantsField(AVATAR_VARIANTS, source='avatar')
 
     class Meta:
         model = User
         fields = ('id', 'username', 'first_name', 'last_name',
-                  'email', 'is_subscribed', 'avatar')
+                  'email', 'is_subscribed', 'avatar', 'avatar_variants')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and Subscriptions.objects.filter(
@@ -32,40 +40,42 @@ class UserInfoSerializer(UserSerializer):
 
 
 class UserSubscribeSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписки или отписки от пользователей."""
+    """Сериализатор подписки: возвращает автора с его рецептами.
+
+    Повторную подписку и подписку на себя отклоняют ограничения базы.
+    """
     class Meta:
         model = Subscriptions
         fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Subscriptions.objects.all(),
-                fields=('user', 'following'),
-                message='Вы уже подписаны на этого пользователя'
-            )
-        ]
-
-    def validate(self, attrs):
-        request = self.context.get('request')
-        following = attrs.get('following')
-
-        if request.user == following:
-            raise serializers.ValidationError(
-                'Подписка на себя недопустима!'
-            )
-        return attrs
 
     def to_representation(self, instance):
         request = self.context.get('request')
+        following = annotate_subscriptions(
+            User.objects.filter(pk=instance.following_id), request.user
+        ).get()
+        prefetch_limited_recipes([following], get_recipes_limit(request))
         return UserSubscriptionsSerializer(
-            instance.following, context={'request': request}
+            following, context={'request': request}
         ).data
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для получения краткой информации о рецепте."""
+    image_variants = ImageVariantsField(RECIPE_VARIANTS, source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+
+class CookableRecipeSerializer(ShortRecipeSerializer):
+    """Рецепт с числом имеющихся и недостающих ингредиентов."""
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + ('matched_count',
+                                                      'missing_count')
 
 
 class UserSubscriptionsSerializer(UserInfoSerializer):
@@ -76,25 +86,23 @@ class UserSubscriptionsSerializer(UserInfoSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'first_name', 'last_name', 'email',
-                  'is_subscribed', 'recipes', 'recipes_count', 'avatar')
+                  'is_subscribed', 'recipes', 'recipes_count', 'avatar',
+                  'avatar_variants')
         read_only_fields = ('email', 'username', 'first_name',
                             'last_name', 'is_subscribed', 'recipes',
-                            'recipes_count', 'avatar')
+                            'recipes_count', 'avatar', 'avatar_variants')
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, instance):
-        request = self.context.get('request')
-        recipe_limit = request.GET.get('recipes_limit')
-        all_recipes = instance.recipes.all()
-        if recipe_limit:
-            try:
-                recipe_limit = int(recipe_limit)
-                all_recipes = all_recipes[:recipe_limit]
-            except ValueError:
-                pass
-        recipe_data = ShortRecipeSerializer(all_recipes, many=True).data
+        if not hasattr(instance, 'limited_recipes'):
+            request = self.context.get('request')
+            prefetch_limited_recipes([instance], get_recipes_limit(request))
+        recipe_data = ShortRecipeSerializer(instance.limited_recipes,
+                                            many=True).data
         return recipe_data
 
 
@@ -128,7 +136,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class IngredientRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с ингредиентами в рецепте."""
-    id = serializers.PrimaryKeyRelatedField(
+    id = PrefetchedPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
         source='ingredient.id'
     )
@@ -144,8 +152,8 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецептов."""
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = PrefetchedPrimaryKeyRelatedField(queryset=Tag.objects.all(),
+                                            many=True)
     ingredients = IngredientRecipeSerializer(many=True,
                                              source='recipeingredient')
     image = Base64ImageField(required=True, allow_null=True)
@@ -155,6 +163,19 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         fields = ('id', 'tags', 'ingredients', 'name',
                   'image', 'text', 'cooking_time')
 
+    def to_internal_value(self, data):
+        # Все ингредиенты и теги проверяются двумя запросами IN.
+        if isinstance(data, dict):
+            ingredients = data.get('ingredients')
+            prefetch_pks(self, Ingredient.objects.all(), (
+                item.get('id') for item in ingredients
+                if isinstance(item, dict)
+            ) if isinstance(ingredients, list) else ())
+            tags = data.get('tags')
+            prefetch_pks(self, Tag.objects.all(),
+                         tags if isinstance(tags, list) else ())
+        return super().to_internal_value(data)
+
     def check_duplicates(self, item_list, item_type):
         """Проверка на дублирование элементов по заданному ключу."""
         if len(set(item_list)) != len(item_list):
@@ -165,23 +186,26 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def validate(self, data):
         """Проверка входных данных на корректность."""
 
+        # При частичном обновлении отсутствующие поля не меняются.
         # Проверка ингредиентов
-        ingredients_data = data.get('recipeingredient')
-        if not ingredients_data:
-            raise serializers.ValidationError('Не указаны ингредиенты.')
-        item_list = []
-        for item in ingredients_data:
-            item_list.append(item.get('ingredient')['id'])
-        self.check_duplicates(item_list, 'ингредиенты')
+        if not self.partial or 'recipeingredient' in data:
+            ingredients_data = data.get('recipeingredient')
+            if not ingredients_data:
+                raise serializers.ValidationError('Не указаны ингредиенты.')
+            item_list = []
+            for item in ingredients_data:
+                item_list.append(item.get('ingredient')['id'])
+            self.check_duplicates(item_list, 'ингредиенты')
 
         # Проверка тегов
-        tags_data = data.get('tags')
-        if not tags_data:
-            raise serializers.ValidationError('Не указаны теги.')
-        item_list = []
-        for item in tags_data:
-            item_list.append(item.id)
-        self.check_duplicates(item_list, 'теги')
+        if not self.partial or 'tags' in data:
+            tags_data = data.get('tags')
+            if not tags_data:
+                raise serializers.ValidationError('Не указаны теги.')
+            item_list = []
+            for item in tags_data:
+                item_list.append(item.id)
+            self.check_duplicates(item_list, 'теги')
 
         return data
 
@@ -215,21 +239,71 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(author=user, **validated_data)
         recipe.tags.set(tags)
         self.ingredient_tag_instance(recipe, ingredients_data)
+        recipe_index.changed([recipe.pk])
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         """Обновление существующего рецепта."""
         ingredients_data = validated_data.pop('recipeingredient', None)
-        tags = validated_data.get('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.ingredient_tag_instance(instance, ingredients_data)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            # set() сам удаляет лишние и добавляет новые связи.
+            instance.tags.set(tags)
+        if ingredients_data is not None:
+            ShoppingListIngredient.objects.apply(
+                instance.carts.values_list('user_id', flat=True),
+                self.update_ingredients(instance, ingredients_data)
+            )
+            recipe_index.changed([instance.pk])
         return super().update(instance, validated_data)
 
+    @staticmethod
+    def update_ingredients(recipe, data):
+        """Меняет только изменившиеся строки RecipeIngredient.
+
+        Возвращает изменения количеств {ingredient_id: разница}
+        для списков покупок.
+        """
+        amounts = {
+            item['ingredient']['id'].id: item['amount'] for item in data
+        }
+        rows = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        deltas = {}
+        to_update = []
+        for ingredient_id, row in rows.items():
+            amount = amounts.get(ingredient_id, 0)
+            if amount != row.amount:
+                deltas[ingredient_id] = amount - row.amount
+                if amount:
+                    row.amount = amount
+                    to_update.append(row)
+        to_create = [
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in rows
+        ]
+        deltas.update((row.ingredient_id, row.amount) for row in to_create)
+        removed = [ingredient_id for ingredient_id in rows
+                   if ingredient_id not in amounts]
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        RecipeIngredient.objects.bulk_update(to_update, ('amount', ))
+        RecipeIngredient.objects.bulk_create(to_create)
+        return deltas
+
     def to_representation(self, instance):
         """Пользовательское представление объекта."""
+        prefetch_related_objects([instance], Prefetch(
+            'recipeingredient',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ))
         return RecipeGetSerializer(instance, context=self.context).data
 
 
@@ -240,6 +314,7 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeSerializer(many=True,
                                              source='recipeingredient')
     image = Base64ImageField(required=False, allow_null=True)
+    image_variants = ImageVariantsField(RECIPE_VARIANTS, source='image')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -247,44 +322,20 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_variants', 'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and Favorites.objects.filter(user=request.user,
                                              favorites=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and ShoppingList.objects.filter(user=request.user,
                                                 recipe=obj).exists())
-
-
-class FavoritesSerializer(serializers.ModelSerializer):
-    """Сериализатор для работы с избранным."""
-    class Meta:
-        model = Favorites
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorites.objects.all(),
-                fields=['user', 'favorites'],
-                message='Рецепт уже добавлен в избранное.'
-            )
-        ]
-
-
-class ShoppingListtSerializer(serializers.ModelSerializer):
-    """Сериализатор для работы со списком покупок."""
-    class Meta:
-        model = ShoppingList
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingList.objects.all(),
-                fields=['user', 'recipe'],
-                message='Рецепт уже добавлен в корзину!'
-            )
-        ]
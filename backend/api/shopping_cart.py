@@ -0,0 +1,46 @@
+import csv
+import json
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(ingredients_data):
+    yield 'Закупочный список:\n'
+    for item in ingredients_data:
+        yield (f'\n\n{item["ingredient__name"]} - {item["total_amount"]}, '
+               f'{item["ingredient__measurement_unit"]}')
+
+
+def render_csv(ingredients_data):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('ингредиент', 'единица измерения', 'количество'))
+    for item in ingredients_data:
+        yield writer.writerow((item['ingredient__name'],
+                               item['ingredient__measurement_unit'],
+                               item['total_amount']))
+
+
+def render_json(ingredients_data):
+    yield '['
+    separator = ''
+    for item in ingredients_data:
+        yield separator + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total_amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+# Формат: (тип содержимого, расширение файла, генератор строк).
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', 'txt', render_txt),
+    'csv': ('text/csv; charset=utf-8', 'csv', render_csv),
+    'json': ('application/json', 'json', render_json),
+}
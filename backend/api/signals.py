@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Выход через djoser и удаление токена в админке."""
+    key = instance.key
+    transaction.on_commit(lambda: forget(key))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, update_fields=None,
+                       **kwargs):
+    """Смена пароля, деактивация и правка профиля."""
+    if created or update_fields is not None and set(
+        update_fields
+    ) <= {'last_login'}:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        transaction.on_commit(lambda key=key: forget(key))
@@ -1,28 +1,127 @@
+import hashlib
+
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import http_date, parse_http_date_safe
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (AllowAny, IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from api.filters import IngredientFilter, RecipeFilter
+from api.pagination import PagePagination, RecipePagination
 from api.permissions import IsAuthenticatedOrAuthorOrReadOnly
-from api.serializers import (FavoritesSerializer, IngredientSerializer,
+from api.querysets import (annotate_is_subscribed, annotate_subscriptions,
+                           get_recipes_limit, prefetch_limited_recipes)
+from api.shopping_cart import EXPORT_FORMATS
+from api.serializers import (CookableRecipeSerializer, IngredientSerializer,
                              RecipeGetSerializer, RecipeCreateSerializer,
-                             ShoppingListtSerializer, ShortRecipeSerializer,
+                             ShortRecipeSerializer,
                              TagSerializer, UserAvatarSerializer,
                              UserSubscribeSerializer,
                              UserSubscriptionsSerializer)
+from foodgram.constant import (MAX_BULK_IDS, MAX_COOK_INGREDIENTS,
+                               MAX_INGREDIENT_SEARCH_RESULTS,
+                               MAX_MISSING_INGREDIENTS)
+from foodgram import response_cache
+from foodgram.ingredient_index import ingredient_index
 from foodgram.models import (Favorites, Ingredient, Recipe,
-                             RecipeIngredient, ShoppingList, Tag)
+                             RecipeIngredient, ShoppingList,
+                             ShoppingListIngredient, Tag)
+from foodgram.recipe_index import recipe_index
+from foodgram_backend.db.replicas import use_primary
 from users.models import Subscriptions
 
 User = get_user_model()
 
+# Параметры списка рецептов, при которых ответ берётся из кэша.
+CACHED_LIST_PARAMS = {'page', 'limit', 'tags', 'tags_match', 'author',
+                      'is_favorited', 'is_in_shopping_cart', 'search',
+                      'cursor'}
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+
+def create_unique(model, message, **fields):
+    """Создаёт запись без предварительной проверки на повтор.
+
+    Повтор отклоняет уникальное ограничение базы, ошибка возвращается
+    в формате ошибок сериализатора.
+    """
+    try:
+        with transaction.atomic():
+            return model.objects.create(**fields)
+    except IntegrityError:
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
+
+def get_bulk_ids(request):
+    """Уникальные id из тела запроса {"ids": [...]} в исходном порядке."""
+    ids = request.data.get('ids') if isinstance(request.data, dict) else None
+    if (not isinstance(ids, list) or not 0 < len(ids) <= MAX_BULK_IDS
+            or not all(type(pk) is int for pk in ids)):
+        raise ValidationError(
+            {'ids': [f'Укажите список от 1 до {MAX_BULK_IDS} id.']}
+        )
+    return list(dict.fromkeys(ids))
+
+
+def bulk_add(user, model, field, ids, targets, invalid=()):
+    """Связывает user с объектами ids одним INSERT.
+
+    targets - queryset объектов, которые можно добавить; повторы
+    пропускает ON CONFLICT DO NOTHING. Возвращает результаты по каждому
+    id и список добавленных id.
+    """
+    found = set(targets.filter(pk__in=ids).values_list('pk', flat=True))
+    existing = set(model.objects.filter(
+        user=user, **{f'{field}_id__in': ids}
+    ).values_list(f'{field}_id', flat=True))
+    results, created = [], []
+    for pk in ids:
+        if pk in invalid:
+            result = 'invalid'
+        elif pk not in found:
+            result = 'not_found'
+        elif pk in existing:
+            result = 'exists'
+        else:
+            result = 'created'
+            created.append(pk)
+        results.append({'id': pk, 'status': result})
+    model.objects.bulk_create(
+        [model(user=user, **{f'{field}_id': pk}) for pk in created],
+        ignore_conflicts=True
+    )
+    return results, created
+
+
+def bulk_remove(user, model, field, ids):
+    """Удаляет связи user с объектами ids одним DELETE ... IN.
+
+    Возвращает результаты по каждому id и список удалённых id.
+    """
+    queryset = model.objects.filter(user=user, **{f'{field}_id__in': ids})
+    existing = set(queryset.values_list(f'{field}_id', flat=True))
+    queryset.delete()
+    return [
+        {'id': pk, 'status': 'deleted' if pk in existing else 'not_found'}
+        for pk in ids
+    ], [pk for pk in ids if pk in existing]
+
+
+def make_etag(*parts):
+    """Строгий ETag по значениям, от которых зависит ответ."""
+    return '"{}"'.format(hashlib.md5(repr(parts).encode()).hexdigest())
+
 
 class UserSubscriptionsViewSet(viewsets.ModelViewSet):
     """Обрабатывает подписки пользователей и возвращает информацию
@@ -31,7 +130,17 @@ class UserSubscriptionsViewSet(viewsets.ModelViewSet):
     http_method_names = ('get', )
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        return annotate_subscriptions(
+            User.objects.filter(following__user=self.request.user),
+            self.request.user
+        )
+
+    def paginate_queryset(self, queryset):
+        """Рецепты авторов страницы загружаются одним запросом."""
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            prefetch_limited_recipes(page, get_recipes_limit(self.request))
+        return page
 
 
 class UserViewSet(DjoserUserViewSet):
@@ -40,6 +149,12 @@ class UserViewSet(DjoserUserViewSet):
     обновление и удаление аватаров."""
     queryset = User.objects.all()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return annotate_is_subscribed(queryset, self.request.user)
+        return queryset
+
     def get_permissions(self):
         if self.action in ('list', 'retrieve', 'create'):
             return (AllowAny(),)
@@ -62,12 +177,16 @@ class UserViewSet(DjoserUserViewSet):
     def subscribe(self, request, id):
         """Подписаться на пользователя."""
         following = get_object_or_404(User, pk=id)
-        serializer = UserSubscribeSerializer(
-            data={'user': request.user.id, 'following': following.id},
-            context={'request': request}
+        if following == request.user:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Подписка на себя недопустима!'
+            ]})
+        subscription = create_unique(
+            Subscriptions, 'Вы уже подписаны на этого пользователя',
+            user=request.user, following=following
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer = UserSubscribeSerializer(subscription,
+                                             context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
@@ -86,6 +205,25 @@ class UserViewSet(DjoserUserViewSet):
             )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        permission_classes=(IsAuthenticated, ),
+        url_path='subscribe',
+        url_name='subscribe-many'
+    )
+    def subscribe_many(self, request):
+        """Подписка или отписка от нескольких пользователей сразу."""
+        ids = get_bulk_ids(request)
+        if request.method == 'POST':
+            results, _ = bulk_add(request.user, Subscriptions, 'following',
+                                  ids, User.objects.all(),
+                                  invalid={request.user.pk})
+        else:
+            results, _ = bulk_remove(request.user, Subscriptions,
+                                     'following', ids)
+        return Response({'results': results})
+
     @action(
         detail=False,
         methods=('put', ),
@@ -114,19 +252,35 @@ class UserViewSet(DjoserUserViewSet):
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """Позволяет управлять тегами, доступными в системе."""
     serializer_class = TagSerializer
-    queryset = Tag.objects.all()
+    queryset = Tag.objects.order_by('-name')
     permission_classes = (AllowAny, )
     pagination_class = None
+    replica_actions = ('list', 'retrieve')
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Обрабатывает действия над ингредиентами и позволяет фильтровать их. """
     serializer_class = IngredientSerializer
-    queryset = Ingredient.objects.all()
+    queryset = Ingredient.objects.order_by('-name')
     permission_classes = (AllowAny, )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    replica_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по началу названия выполняется по индексу в памяти.
+
+        Пустое название, как и у IngredientFilter, не фильтрует список.
+        """
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            serializer = self.get_serializer(self.get_queryset(), many=True)
+            return Response(serializer.data)
+        ingredients = ingredient_index.search(name,
+                                              MAX_INGREDIENT_SEARCH_RESULTS)
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -137,7 +291,149 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticatedOrAuthorOrReadOnly, )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
     http_method_names = ('get', 'post', 'patch', 'delete')
+    replica_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        """Для чтения рецепты загружаются вместе со связями и флагами
+        пользователя, чтобы число запросов не зависело от размера страницы."""
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        user = self.request.user
+        return queryset.with_user_flags(user).prefetch_related(
+            Prefetch('author', queryset=annotate_is_subscribed(
+                User.objects.all(), user
+            )),
+            Prefetch('tags', queryset=Tag.objects.order_by('-name')),
+            Prefetch('recipeingredient',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient'
+                     )),
+        )
+
+    def get_validators(self, request, queryset):
+        """ETag и Last-Modified для набора рецептов.
+
+        Считаются одним агрегатным запросом без сериализации. В ETag также
+        входит состояние подписок пользователя, так как от него зависит
+        поле is_subscribed автора.
+        """
+        state = queryset.order_by().aggregate(
+            updated_at=Max('updated_at'), count=Count('pk')
+        )
+        user = request.user
+        subscriptions = None
+        if user.is_authenticated:
+            subscriptions = user.follower.aggregate(
+                count=Count('pk'), last=Max('pk')
+            )
+        etag = make_etag(request.get_full_path(), user.pk, state,
+                         subscriptions)
+        last_modified = state['updated_at'] and int(
+            state['updated_at'].timestamp()
+        )
+        return etag, last_modified
+
+    def conditional_response(self, view_method, queryset, use_last_modified,
+                             request, *args, **kwargs):
+        """Возвращает 304, если версия данных у клиента актуальна,
+        иначе ответ view_method."""
+        etag, last_modified = self.get_validators(request, queryset)
+        if not use_last_modified:
+            last_modified = None
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        patch_vary_headers(response, ('Authorization', ))
+        return response
+
+    def cached_response(self, request, versions, view_method, *args,
+                        **kwargs):
+        """Ответ анонимному пользователю из кэша.
+
+        Для анонимного пользователя флаги избранного и списка покупок
+        всегда ложны, поэтому ответ зависит только от параметров запроса
+        и версий versions. Сохраняются данные до рендеринга и заголовки
+        условных запросов.
+        """
+        if request.user.is_authenticated:
+            return view_method(request, *args, **kwargs)
+        params = request.query_params
+        key = response_cache.make_key(versions, (
+            request.scheme, request.get_host(), request.path,
+            sorted((name, sorted(set(params.getlist(name))))
+                   for name in params if (name, params[name]) != ('page', '1'))
+        ))
+        cached = response_cache.load(key)
+        if cached is None:
+            # Кэш сбрасывается при записи: заполняется из основной базы,
+            # чтобы не запомнить состояние отстающей реплики.
+            with use_primary():
+                response = view_method(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response_cache.store(key, (response.data, {
+                    header: response[header] for header in CACHED_HEADERS
+                    if response.has_header(header)
+                }))
+            response['X-Cache'] = 'MISS'
+            return response
+        data, headers = cached
+        response = get_conditional_response(
+            request, etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(headers.get('Last-Modified'))
+        ) or Response(data)
+        for header, value in headers.items():
+            response[header] = value
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов с поддержкой условных запросов.
+
+        Last-Modified не отдаётся: удаление рецепта не меняет
+        максимальную дату изменения, это отражает только ETag.
+        """
+        if set(request.query_params) - CACHED_LIST_PARAMS:
+            return self.list_response(request, *args, **kwargs)
+        return self.cached_response(
+            request, (response_cache.LIST, ), self.list_response,
+            *args, **kwargs
+        )
+
+    def list_response(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(super().get_queryset())
+        return self.conditional_response(super().list, queryset, False,
+                                         request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт с поддержкой условных запросов.
+
+        Подписки пользователя не отражаются в дате изменения рецепта,
+        поэтому Last-Modified отдаётся только анонимным пользователям.
+        """
+        if request.query_params or not kwargs['pk'].isdigit():
+            return self.retrieve_response(request, *args, **kwargs)
+        return self.cached_response(
+            request, (response_cache.recipe_version(int(kwargs['pk'])),
+                      response_cache.CATALOG),
+            self.retrieve_response, *args, **kwargs
+        )
+
+    def retrieve_response(self, request, *args, **kwargs):
+        queryset = super().get_queryset().filter(pk=kwargs['pk'])
+        return self.conditional_response(
+            super().retrieve, queryset, not request.user.is_authenticated,
+            request, *args, **kwargs
+        )
 
     def get_serializer_class(self):
         """Выбор сериализатора в зависимости от типа действия."""
@@ -146,12 +442,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeCreateSerializer
 
     @staticmethod
-    def create_method(request, recipe, item, item_serializer):
-        data = {'user': request.user.id, item: recipe.id}
-        serializer = item_serializer(data=data,
-                                     context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+    def create_method(request, recipe, obj_model, filter_field, message):
+        create_unique(obj_model, message,
+                      **{'user': request.user, filter_field: recipe})
+        Recipe.objects.filter(pk=recipe.pk).touch()
         return Response(ShortRecipeSerializer(recipe).data,
                         status=status.HTTP_201_CREATED)
 
@@ -163,6 +457,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(
                 {'errors': 'Ошибка при удалении из списка покупок!'},
                 status=status.HTTP_400_BAD_REQUEST)
+        Recipe.objects.filter(pk=recipe.pk).touch()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -175,8 +470,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, id=pk)
 
         if request.method == 'POST':
-            return self.create_method(request, recipe, 'favorites',
-                                      FavoritesSerializer)
+            return self.create_method(request, recipe, Favorites,
+                                      'favorites',
+                                      'Рецепт уже добавлен в избранное.')
         return self.delete_method(request, recipe, Favorites, 'favorites')
 
     @action(
@@ -184,14 +480,72 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=('post', 'delete'),
         permission_classes=(IsAuthenticated, )
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
         """Добавление или удаление рецепта из списка покупок."""
         recipe = get_object_or_404(Recipe, pk=pk)
 
         if request.method == 'POST':
-            return self.create_method(request, recipe, 'recipe',
-                                      ShoppingListtSerializer)
-        return self.delete_method(request, recipe, ShoppingList, 'recipe')
+            response = self.create_method(request, recipe, ShoppingList,
+                                          'recipe',
+                                          'Рецепт уже добавлен в корзину!')
+            sign = 1
+        else:
+            response = self.delete_method(request, recipe, ShoppingList,
+                                          'recipe')
+            sign = -1
+        if status.is_success(response.status_code):
+            ShoppingListIngredient.objects.apply(
+                (request.user.id, ),
+                {ingredient_id: sign * amount for ingredient_id, amount
+                 in recipe.ingredient_amounts().items()}
+            )
+        return response
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        permission_classes=(IsAuthenticated, ),
+        url_path='favorite',
+        url_name='favorite-many'
+    )
+    def favorite_many(self, request):
+        """Добавление или удаление нескольких рецептов из избранного."""
+        ids = get_bulk_ids(request)
+        if request.method == 'POST':
+            results, changed = bulk_add(request.user, Favorites, 'favorites',
+                                        ids, Recipe.objects.all())
+        else:
+            results, changed = bulk_remove(request.user, Favorites,
+                                           'favorites', ids)
+        Recipe.objects.filter(pk__in=changed).touch()
+        return Response({'results': results})
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        permission_classes=(IsAuthenticated, ),
+        url_path='shopping_cart',
+        url_name='shopping-cart-many'
+    )
+    @transaction.atomic
+    def shopping_cart_many(self, request):
+        """Добавление или удаление нескольких рецептов из списка покупок.
+
+        Суммы пересчитываются по корзине целиком: при параллельных
+        запросах добавленные ON CONFLICT строки точно неизвестны.
+        """
+        ids = get_bulk_ids(request)
+        if request.method == 'POST':
+            results, changed = bulk_add(request.user, ShoppingList, 'recipe',
+                                        ids, Recipe.objects.all())
+        else:
+            results, changed = bulk_remove(request.user, ShoppingList,
+                                           'recipe', ids)
+        if changed:
+            Recipe.objects.filter(pk__in=changed).touch()
+            ShoppingListIngredient.objects.rebuild((request.user.id, ))
+        return Response({'results': results})
 
     @action(
         detail=False,
@@ -199,27 +553,94 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated, )
     )
     def download_shopping_cart(self, request):
-        """Генерация файла с закупочным списком."""
-        ingredients_data = RecipeIngredient.objects.filter(
-            recipe__carts__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
-        return self.create_shopping_list(ingredients_data)
-
-    def create_shopping_list(self, ingredients_data):
-        shopping_list_text = ['Закупочный список:\n']
-        for item in ingredients_data:
-            name = item['ingredient__name']
-            unit = item['ingredient__measurement_unit']
-            total_amount = item['total_amount']
-            shopping_list_text.append(f'\n{name} - {total_amount}, {unit}')
-        file_response = HttpResponse('\n'.join(shopping_list_text),
-                                     content_type='text/plain')
+        """Генерация файла с закупочным списком.
+
+        Формат задаётся параметром file_format: txt, csv или json.
+        Суммы читаются из ShoppingListIngredient. ETag считается по составу
+        корзины и датам изменения рецептов, поэтому повторная загрузка
+        неизменной корзины не читает список.
+        """
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'errors': 'Неизвестный формат файла: '
+                           f'{", ".join(EXPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        cart = request.user.carts.aggregate(
+            count=Count('pk'), last=Max('pk'),
+            updated_at=Max('recipe__updated_at')
+        )
+        etag = make_etag(request.user.pk, file_format, cart)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            ingredients_data = ShoppingListIngredient.objects.filter(
+                user=request.user
+            ).values(
+                'ingredient__name', 'ingredient__measurement_unit',
+                'total_amount'
+            ).order_by('ingredient__name')
+            response = self.create_shopping_list(
+                ingredients_data.iterator(), file_format
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def create_shopping_list(self, ingredients_data, file_format='txt'):
+        content_type, extension, render = EXPORT_FORMATS[file_format]
+        file_response = StreamingHttpResponse(render(ingredients_data),
+                                              content_type=content_type)
         file_response['Content-Disposition'] = \
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{extension}"'
         return file_response
 
+    @action(
+        detail=False,
+        methods=('get', ),
+        pagination_class=PagePagination
+    )
+    def what_can_i_cook(self, request):
+        """Рецепты, которые можно приготовить из имеющихся ингредиентов.
+
+        Ингредиенты передаются параметрами ingredients, рецепты
+        упорядочены по числу недостающих (не больше max_missing). Поиск
+        идёт по индексу в памяти, из базы читаются только рецепты страницы.
+        """
+        try:
+            ingredient_ids = {
+                int(value)
+                for value in request.query_params.getlist('ingredients')
+            }
+            max_missing = int(request.query_params.get(
+                'max_missing', MAX_MISSING_INGREDIENTS
+            ))
+        except ValueError:
+            ingredient_ids, max_missing = None, 0
+        if (not ingredient_ids or max_missing < 0
+                or len(ingredient_ids) > MAX_COOK_INGREDIENTS):
+            return Response(
+                {'errors': 'Укажите от 1 до '
+                           f'{MAX_COOK_INGREDIENTS} id ингредиентов '
+                           'и неотрицательный max_missing.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(
+            recipe_index.search(ingredient_ids, max_missing)
+        )
+        recipes = Recipe.objects.only(
+            'name', 'image', 'cooking_time'
+        ).in_bulk([-recipe_id for _, _, recipe_id in page])
+        results = []
+        for missing, matched, recipe_id in page:
+            recipe = recipes.get(-recipe_id)
+            # Рецепт могли удалить до обновления индекса.
+            if recipe is not None:
+                recipe.matched_count, recipe.missing_count = -matched, missing
+                results.append(recipe)
+        serializer = CookableRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=('get', ),
@@ -1,25 +1,54 @@
 from django.contrib import admin
 
+from foodgram import response_cache
 from foodgram.models import (Favorites, Ingredient, Recipe,
-                             RecipeIngredient, Tag, ShoppingList)
+                             RecipeIngredient, Tag, ShoppingList,
+                             ShoppingListIngredient)
+from foodgram.recipe_index import recipe_index
+
+
+class TouchRecipesMixin:
+    """Отмечает связанные рецепты изменёнными при правке в админке."""
+    recipes_lookup = None
+
+    def touch_recipes(self, objects):
+        Recipe.objects.filter(
+            **{f'{self.recipes_lookup}__in': objects}
+        ).touch()
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.touch_recipes([obj])
+
+    def delete_model(self, request, obj):
+        self.touch_recipes([obj])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        self.touch_recipes(queryset)
+        super().delete_queryset(request, queryset)
 
 
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(TouchRecipesMixin, admin.ModelAdmin):
     """Раздел тегов в админке."""
     list_display = ('name', 'slug')
     empty_value_display = 'значение отсутствует'
     list_filter = ('name',)
     search_fields = ('name',)
+    ordering = ('-name',)
+    recipes_lookup = 'tags'
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(TouchRecipesMixin, admin.ModelAdmin):
     """Раздел ингредиентов в админке."""
     list_display = ('name', 'measurement_unit')
     empty_value_display = 'значение отсутствует'
     list_filter = ('name', )
     search_fields = ('name', )
+    ordering = ('-name', )
+    recipes_lookup = 'ingredients'
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -41,29 +70,107 @@ class RecipeAdmin(admin.ModelAdmin):
     def count_is_favorite(self, obj):
         return obj.favorites.count()
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        ShoppingListIngredient.objects.rebuild(
+            form.instance.carts.values_list('user_id', flat=True)
+        )
+        recipe_index.changed([form.instance.pk])
+
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(TouchRecipesMixin, admin.ModelAdmin):
     """Раздел ингредиентов рецепта в админке."""
     list_display = ('recipe', 'ingredient', 'amount')
     empty_value_display = 'значение отсутствует'
     list_filter = ('recipe', 'ingredient')
     search_fields = ('ingredient__name',)
+    ordering = ('-recipe__pub_date',)
+    recipes_lookup = 'recipeingredient'
+
+    @staticmethod
+    def rebuild_shopping_lists(recipe_ids):
+        ShoppingListIngredient.objects.rebuild(
+            ShoppingList.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('user_id', flat=True)
+        )
+        recipe_index.changed(recipe_ids)
+        for recipe_id in set(recipe_ids):
+            # Сигналы RecipeIngredient не подключены: с ними Django
+            # выбирал бы строки перед каждым удалением.
+            response_cache.recipe_changed(recipe_id)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.rebuild_shopping_lists([obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.rebuild_shopping_lists([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.rebuild_shopping_lists(recipe_ids)
+
+
+class UserRecipeAdmin(admin.ModelAdmin):
+    """Избранное и списки покупок: флаги пользователя входят в ответы
+    с рецептами, поэтому правка в админке меняет их ETag."""
+    recipe_field = None
+
+    def get_rows(self, obj, form=None):
+        """Пары (пользователь, рецепт) до и после правки."""
+        rows = {(obj.user_id, getattr(obj, f'{self.recipe_field}_id'))}
+        if form is not None and form.initial:
+            rows.add((form.initial['user'], form.initial[self.recipe_field]))
+        return rows
+
+    def rows_changed(self, rows):
+        recipe_ids = {recipe_id for _, recipe_id in rows}
+        Recipe.objects.filter(pk__in=recipe_ids).touch()
+        for recipe_id in recipe_ids:
+            response_cache.recipe_changed(recipe_id)
+
+    def save_model(self, request, obj, form, change):
+        rows = self.get_rows(obj, form if change else None)
+        super().save_model(request, obj, form, change)
+        self.rows_changed(rows)
+
+    def delete_model(self, request, obj):
+        rows = self.get_rows(obj)
+        super().delete_model(request, obj)
+        self.rows_changed(rows)
+
+    def delete_queryset(self, request, queryset):
+        rows = set(queryset.values_list('user_id', f'{self.recipe_field}_id'))
+        super().delete_queryset(request, queryset)
+        self.rows_changed(rows)
 
 
 @admin.register(Favorites)
-class FavoritesAdmin(admin.ModelAdmin):
+class FavoritesAdmin(UserRecipeAdmin):
     """Раздел избранных рецептов в админке."""
     list_display = ('user', 'favorites')
     list_filter = ('user', 'favorites')
     search_fields = ('user__username', 'favorites__name')
     ordering = ('user', 'favorites')
+    recipe_field = 'favorites'
 
 
 @admin.register(ShoppingList)
-class ShoppingListAdmin(admin.ModelAdmin):
+class ShoppingListAdmin(UserRecipeAdmin):
     """Раздел списка покупок в админке."""
     list_display = ('user', 'recipe')
     empty_value_display = 'значение отсутствует'
     list_filter = ('user',)
     search_fields = ('recipe__name',)
+    ordering = ('-recipe__pub_date',)
+    recipe_field = 'recipe'
+
+    def rows_changed(self, rows):
+        super().rows_changed(rows)
+        ShoppingListIngredient.objects.rebuild(
+            {user_id for user_id, _ in rows}
+        )
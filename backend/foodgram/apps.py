@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class FoodgramConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodgram'
+
+    def ready(self):
+        import foodgram.checks  # noqa: F401
+        import foodgram.signals
+        post_migrate.connect(foodgram.signals.restore_search_triggers,
+                             sender=self)
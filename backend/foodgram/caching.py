@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache, caches
+
+# Бэкенды, у которых каждый процесс видит только свои записи.
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+LOCAL_CACHE_WARNING = (
+    'Кэш Django в памяти процесса: запущенный сервер не увидит изменения '
+    'до перезапуска. Задайте общий CACHE_BACKEND.'
+)
+
+
+def is_shared(alias='default'):
+    """Видят ли записи кэша другие процессы: воркеры сервера и команды."""
+    backend = caches[alias]
+    path = f'{type(backend).__module__}.{type(backend).__name__}'
+    return path not in PROCESS_LOCAL_BACKENDS
+
+
+def initial_version():
+    """Начальное значение счётчика версии.
+
+    Если счётчик вытеснен из кэша, новая версия не совпадёт с уже
+    использованной, и процессы не примут старые данные за новые.
+    """
+    return time.time_ns()
+
+
+def get_versions(keys):
+    """Текущие версии счётчиков keys в общем кэше."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def get_version(key):
+    return get_versions([key])[0]
+
+
+def bump_version(key):
+    """Увеличивает версию key и возвращает новое значение."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial_version(), timeout=None)
+        return cache.get(key)
+
+
+class LRUCache:
+    """Ограниченный по размеру LRU-кэш процесса с временем жизни записей.
+
+    Ставится перед общим кэшем Django. Время жизни ограничивает
+    устаревание в процессах, которым не приходят сигналы об изменениях.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
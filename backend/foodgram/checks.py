@@ -0,0 +1,19 @@
+from django.core.checks import Tags, Warning, register
+
+from foodgram import caching
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Версии индексов, кэш ответов и отзыв токенов передаются между
+    процессами через кэш Django."""
+    if caching.is_shared():
+        return []
+    return [Warning(
+        'CACHE_BACKEND хранит данные в памяти процесса: изменения из других '
+        'воркеров и команд управления не сбрасывают их кэши.',
+        hint='Задайте общий кэш, например '
+             'CACHE_BACKEND=django.core.cache.backends.memcached.'
+             'PyMemcacheCache и CACHE_LOCATION=cache:11211.',
+        id='foodgram.W001',
+    )]
@@ -3,8 +3,13 @@ MAX_MEASUREMENT = 64
 MAX_TAG_NAME = 32
 MAX_TAG_SLUG = 32
 MAX_NAME_RECIPE = 256
-MAX_UNIQ_CODE = 4
+MIN_UNIQ_CODE = 4
+MAX_UNIQ_CODE = 8
 MIN_AMOUNT_INGREDIENT = 1
 MAX_AMOUNT_INGREDIENT = 32767
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 32767
+MAX_INGREDIENT_SEARCH_RESULTS = 100
+MAX_MISSING_INGREDIENTS = 3
+MAX_COOK_INGREDIENTS = 100
+MAX_BULK_IDS = 100
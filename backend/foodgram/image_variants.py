@@ -0,0 +1,113 @@
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from foodgram.caching import LRUCache
+
+# Вариант: наибольшие ширина и высота; пропорции сохраняются.
+RECIPE_VARIANTS = {'card': (480, 480), 'detail': (1200, 1200)}
+AVATAR_VARIANTS = {'avatar': (160, 160)}
+# Формат Pillow: (расширение, параметры сохранения).
+VARIANT_FORMATS = {
+    'JPEG': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'WEBP': ('webp', {'quality': 80, 'method': 4}),
+}
+# Фон для изображений с прозрачностью при сохранении в JPEG.
+BACKGROUND = (255, 255, 255)
+
+# Изображения, все варианты которых уже созданы. Отсутствие варианта
+# не запоминается: он появится после генерации.
+ready_cache = LRUCache(settings.IMAGE_VARIANT_CACHE_SIZE,
+                       settings.IMAGE_VARIANT_CACHE_TTL)
+
+
+def variant_name(name, variant, image_format):
+    """Путь варианта рядом с оригиналом: dir/variants/<файл>.<вариант>.<ext>.
+
+    Путь вычисляется из имени оригинала, поэтому ссылки на варианты
+    строятся без обращения к базе и хранилищу. Имя файла берётся
+    с расширением: temp.png и temp.jpeg получают разные варианты.
+    """
+    directory, filename = posixpath.split(name)
+    extension = VARIANT_FORMATS[image_format][0]
+    return posixpath.join(directory, 'variants',
+                          f'{filename}.{variant}.{extension}')
+
+
+def variant_names(name, variants):
+    """{ключ варианта: путь}, ключи вида card и card_webp."""
+    return {
+        variant if image_format == 'JPEG'
+        else f'{variant}_{image_format.lower()}':
+        variant_name(name, variant, image_format)
+        for variant in variants for image_format in VARIANT_FORMATS
+    }
+
+
+def variants_ready(name, variants, storage=default_storage):
+    """Созданы ли все варианты изображения name."""
+    if ready_cache.get(name):
+        return True
+    ready = all(storage.exists(path)
+                for path in variant_names(name, variants).values())
+    if ready:
+        ready_cache.set(name, True)
+    return ready
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+
+
+def convert(image, image_format):
+    """Режим для сохранения: прозрачность только в WebP."""
+    if image.mode == 'RGB' or image_format != 'JPEG':
+        return image
+    background = Image.new('RGB', image.size, BACKGROUND)
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def generate_variants(name, variants, storage=default_storage, force=False):
+    """Создаёт уменьшенные JPEG и WebP копии изображения name.
+
+    Без force ничего не делает, если варианты уже есть.
+    Возвращает True, если варианты были созданы.
+    """
+    names = variant_names(name, variants)
+    if not force and all(storage.exists(path) for path in names.values()):
+        return False
+    with storage.open(name, 'rb') as file, Image.open(file) as original:
+        # Первый кадр анимации, ориентация по EXIF; палитра
+        # раскрывается, иначе уменьшение идёт без сглаживания.
+        original.seek(0)
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if has_alpha(image) else 'RGB')
+        for variant, size in variants.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            for image_format, (_, options) in VARIANT_FORMATS.items():
+                buffer = BytesIO()
+                convert(resized, image_format).save(buffer, image_format,
+                                                    **options)
+                path = variant_name(name, variant, image_format)
+                # Тот же путь, а не новое имя с суффиксом от хранилища.
+                storage.delete(path)
+                storage.save(path, ContentFile(buffer.getvalue()))
+    ready_cache.set(name, True)
+    return True
+
+
+def delete_variants(name, variants, storage=default_storage):
+    """Удаляет варианты изображения name.
+
+    Хранилище может выдать имя удалённого оригинала новому файлу,
+    и тот не должен получить чужие варианты.
+    """
+    ready_cache.delete(name)
+    for path in variant_names(name, variants).values():
+        storage.delete(path)
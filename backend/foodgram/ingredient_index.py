@@ -0,0 +1,101 @@
+import bisect
+import heapq
+import threading
+
+from foodgram import caching
+from foodgram.models import Ingredient
+from foodgram_backend.db.replicas import use_primary
+
+VERSION_CACHE_KEY = 'ingredient_index_version'
+# Символ, больший любого символа в названии, для верхней границы префикса.
+MAX_CHAR = '\U0010ffff'
+
+
+def rank(key):
+    """Порядок выдачи: сначала более короткие названия, затем по алфавиту."""
+    return len(key[0]), key
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для поиска по префиксу.
+
+    Хранит отсортированный список названий, приведённых к нижнему
+    регистру (casefold), и ищет по нему двоичным поиском. Версия индекса
+    хранится в общем кэше Django: изменение ингредиентов в одном процессе,
+    в том числе командой load_ingredients, заставляет остальные процессы
+    перестроить свой индекс. С кэшем в памяти процесса (LocMemCache)
+    другие процессы изменений не видят.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+
+    def build(self):
+        """Строит индекс заново по таблице ингредиентов."""
+        with self._lock:
+            version = caching.get_version(VERSION_CACHE_KEY)
+            with use_primary():
+                items = {
+                    ingredient.pk: ingredient
+                    for ingredient in Ingredient.objects.order_by()
+                }
+            keys = sorted(
+                (ingredient.name.casefold(), pk)
+                for pk, ingredient in items.items()
+            )
+            self._snapshot = (keys, items)
+            self._version = version
+
+    def _get_snapshot(self):
+        version = caching.get_version(VERSION_CACHE_KEY)
+        if self._snapshot is None or self._version != version:
+            self.build()
+        return self._snapshot
+
+    def invalidate(self):
+        """Помечает индексы всех процессов устаревшими."""
+        caching.bump_version(VERSION_CACHE_KEY)
+
+    def _apply(self, pk, ingredient=None):
+        """Заменяет или удаляет запись без полной перестройки индекса."""
+        version = caching.bump_version(VERSION_CACHE_KEY)
+        with self._lock:
+            if self._snapshot is None or self._version != version - 1:
+                return
+            keys, items = self._snapshot
+            keys, items = list(keys), dict(items)
+            old = items.pop(pk, None)
+            if old is not None:
+                keys.remove((old.name.casefold(), pk))
+            if ingredient is not None:
+                items[pk] = ingredient
+                bisect.insort(keys, (ingredient.name.casefold(), pk))
+            self._snapshot = (keys, items)
+            self._version = version
+
+    def update(self, ingredient):
+        self._apply(ingredient.pk, ingredient)
+
+    def remove(self, pk):
+        self._apply(pk)
+
+    def search(self, prefix, limit=None):
+        """Ингредиенты, название которых начинается с prefix.
+
+        Сначала идёт точное совпадение, затем более короткие названия.
+        """
+        keys, items = self._get_snapshot()
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(keys, (prefix,))
+        end = bisect.bisect_left(keys, (prefix + MAX_CHAR,), start)
+        matches = keys[start:end]
+        if limit is None:
+            matches.sort(key=rank)
+        else:
+            matches = heapq.nsmallest(limit, matches, key=rank)
+        return [items[pk] for _, pk in matches]
+
+
+ingredient_index = IngredientIndex()
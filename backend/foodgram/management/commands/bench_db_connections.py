@@ -0,0 +1,50 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from foodgram_backend.db import pool
+
+
+def handle_requests(count):
+    """Выполняется в потоке: count «запросов» по одному SELECT."""
+    for _ in range(count):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        # Как в конце HTTP-запроса: соединение закрывается, возвращается
+        # в пул или остаётся открытым по CONN_MAX_AGE.
+        close_old_connections()
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Runs short requests from several threads with the configured '
+            'connection settings and prints connection counters')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Requests per thread')
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f'CONN_MAX_AGE={settings_dict["CONN_MAX_AGE"]}, '
+            f'POOL={settings_dict.get("POOL")}, '
+            f'HEALTH_CHECKS={settings_dict.get("HEALTH_CHECKS")}'
+        )
+        pool.reset_stats()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            list(executor.map(handle_requests,
+                              [options['requests']] * options['threads']))
+        elapsed = time.perf_counter() - start
+        total = options['threads'] * options['requests']
+        self.stdout.write(
+            f'{total} запросов за {elapsed:.2f} с, '
+            f'{total / elapsed:.0f} запросов в секунду'
+        )
+        self.stdout.write(', '.join(
+            f'{name} {value}' for name, value in pool.stats().items()
+        ))
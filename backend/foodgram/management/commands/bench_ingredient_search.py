@@ -0,0 +1,82 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.constant import MAX_INGREDIENT_SEARCH_RESULTS
+from foodgram.ingredient_index import ingredient_index
+from foodgram.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = 'Compares ingredient prefix search: ORM vs in-memory index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=settings.BASE_DIR.parent / 'data' / 'ingredients.json',
+            help='JSON catalog added for the benchmark in a transaction '
+                 'that is rolled back afterwards'
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with open(options['file'], encoding='utf-8') as file:
+            catalog = json.load(file)
+        # Каталог не меняется: строки видны только внутри транзакции,
+        # а версия индекса в общем кэше не сбрасывается.
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                (Ingredient(**item) for item in catalog),
+                ignore_conflicts=True
+            )
+            self.benchmark(catalog, options['repeat'])
+            transaction.set_rollback(True)
+
+    def benchmark(self, catalog, repeat):
+        # Префиксы, которые набирает пользователь: 1, 2 и 3 первых символа.
+        prefixes = sorted({
+            item['name'][:length]
+            for item in catalog for length in (1, 2, 3)
+        })
+        self.stdout.write(
+            f'Ингредиентов: {Ingredient.objects.count()}, '
+            f'префиксов: {len(prefixes)}, повторов: {repeat}'
+        )
+
+        start = time.perf_counter()
+        ingredient_index.build()
+        build_time = time.perf_counter() - start
+
+        orm_time = self.measure(
+            lambda prefix: list(
+                Ingredient.objects.filter(name__istartswith=prefix)
+            ),
+            prefixes, repeat
+        )
+        index_time = self.measure(
+            lambda prefix: ingredient_index.search(
+                prefix, MAX_INGREDIENT_SEARCH_RESULTS
+            ),
+            prefixes, repeat
+        )
+        queries = len(prefixes) * repeat
+        self.stdout.write(f'Построение индекса: {build_time * 1000:.1f} мс')
+        for label, total in (('ORM', orm_time), ('Индекс', index_time)):
+            self.stdout.write(
+                f'{label}: {total:.3f} с, '
+                f'{total / queries * 1_000_000:.1f} мкс на запрос'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Ускорение: {orm_time / index_time:.1f}x'
+        ))
+
+    @staticmethod
+    def measure(search, prefixes, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for prefix in prefixes:
+                search(prefix)
+        return time.perf_counter() - start
@@ -0,0 +1,135 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from foodgram import constant
+from foodgram.models import Recipe
+from foodgram.short_codes import (ALPHABET, BASE, code_length, decode_code,
+                                  encode_code)
+
+User = get_user_model()
+
+# Случайные коды выбираются из части пространства с общим префиксом:
+# заполнить её до 99.9 % можно тысячами строк, а не миллионами.
+# Число попыток зависит только от доли занятых кодов.
+PREFIX = 'zz'
+SUBSPACE = BASE ** (constant.MIN_UNIQ_CODE - len(PREFIX))
+
+
+class Command(BaseCommand):
+    help = ('Measures short code allocation at high table fill: random '
+            'codes with exists() retries vs codes computed from pk. '
+            'Everything runs in a rolled-back transaction')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200,
+                            help='Recipes inserted per fill level')
+        parser.add_argument('--fills', default='0.5,0.9,0.99,0.999')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.stdout.write(
+            f'Пространство случайных кодов: {SUBSPACE} ({PREFIX}**)'
+        )
+        with transaction.atomic():
+            self.author = User.objects.create(
+                username='bench_short_codes',
+                email='bench_short_codes@example.com'
+            )
+            for fill in map(float, options['fills'].split(',')):
+                with transaction.atomic():
+                    self.benchmark(fill, options['recipes'])
+                    transaction.set_rollback(True)
+            transaction.set_rollback(True)
+
+        space = BASE ** constant.MIN_UNIQ_CODE
+        first_pk = space - options['recipes'] // 2
+        start = time.perf_counter()
+        for pk in range(first_pk, first_pk + options['recipes']):
+            assert decode_code(encode_code(pk)) == pk
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Вычисление кода: {elapsed / options["recipes"] * 1e6:.1f} мкс, '
+            f'длина кода для pk={space}: {code_length(space)}'
+        ))
+
+    def benchmark(self, fill, count):
+        """Заполняет таблицу до fill и вставляет count рецептов обоими
+        способами. Каждая вставка откатывается, заполненность не растёт."""
+        first_pk = (Recipe.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+        pks = range(first_pk, first_pk + count)
+        taken = set(Recipe.objects.filter(
+            uniq_code__startswith=PREFIX
+        ).values_list('uniq_code', flat=True))
+        free = [code for code in map(self.random_code, range(SUBSPACE))
+                if code not in taken]
+        self.rng.shuffle(free)
+        codes = free[:max(0, int(SUBSPACE * fill) - len(taken))]
+        # Старый случайный код занимает код из pk с вероятностью fill.
+        codes.extend(encode_code(pk) for pk in pks
+                     if self.rng.random() < fill)
+        filler_pk = first_pk + count
+        Recipe.objects.bulk_create(
+            self.recipe(filler_pk + index, code)
+            for index, code in enumerate(dict.fromkeys(codes))
+        )
+
+        random_results = [self.insert_random(pk) for pk in pks]
+        pk_results = [self.insert_from_pk(pk) for pk in pks]
+        self.report(fill, 'случайные коды', random_results)
+        self.report(fill, 'коды из pk', pk_results)
+
+    def recipe(self, pk, code=''):
+        return Recipe(pk=pk, author=self.author, name=f'Рецепт {pk}',
+                      text='Описание', cooking_time=10, uniq_code=code)
+
+    @staticmethod
+    def random_code(index):
+        suffix = ''.join(
+            ALPHABET[(index // BASE ** position) % BASE]
+            for position in range(constant.MIN_UNIQ_CODE - len(PREFIX))
+        )
+        return PREFIX + suffix
+
+    def insert_random(self, pk):
+        """Прежний способ: случайный код, пока exists() не найдёт
+        свободный. Возвращает (число запросов exists(), время)."""
+        start = time.perf_counter()
+        with transaction.atomic():
+            attempts = 0
+            while True:
+                attempts += 1
+                code = self.random_code(self.rng.randrange(SUBSPACE))
+                if not Recipe.objects.filter(uniq_code=code).exists():
+                    break
+            self.recipe(pk, code).save(force_insert=True)
+            transaction.set_rollback(True)
+        return attempts, time.perf_counter() - start
+
+    def insert_from_pk(self, pk):
+        """Код из pk через Recipe.assign_uniq_code. Возвращает (число
+        UPDATE, время)."""
+        recipe = self.recipe(pk)
+        start = time.perf_counter()
+        with transaction.atomic():
+            recipe.save(force_insert=True)
+            transaction.set_rollback(True)
+        elapsed = time.perf_counter() - start
+        return len(recipe.uniq_code) - code_length(pk) + 1, elapsed
+
+    def report(self, fill, label, results):
+        attempts = sorted(attempts for attempts, _ in results)
+        times = sorted(elapsed * 1000 for _, elapsed in results)
+        p99 = int(len(results) * 0.99)
+        self.stdout.write(
+            f'Заполнено {fill:.1%}, {label}: '
+            f'в среднем {sum(attempts) / len(attempts):.2f} попыток, '
+            f'{sum(times) / len(times):.2f} мс на вставку, '
+            f'p99 {times[p99]:.2f} мс, максимум {times[-1]:.2f} мс '
+            f'({attempts[-1]} попыток)'
+        )
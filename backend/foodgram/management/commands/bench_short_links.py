@@ -0,0 +1,48 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from foodgram.models import Recipe
+from foodgram.short_links import forget, local_cache
+from foodgram.views import ShortLinkViewSet
+
+
+class Command(BaseCommand):
+    help = 'Measures short link redirects per second with and without cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--links', type=int, default=100,
+                            help='How many distinct recipes are shared')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        codes = list(Recipe.objects.values_list(
+            'uniq_code', flat=True
+        )[:options['links']])
+        if not codes:
+            raise CommandError('Нет рецептов: сначала создайте данные.')
+        rng = random.Random(options['seed'])
+        # Популярность ссылок распределена по закону Ципфа.
+        weights = [1 / rank for rank in range(1, len(codes) + 1)]
+        sample = rng.choices(codes, weights, k=options['requests'])
+        factory = RequestFactory(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0].lstrip('.*') or 'localhost'
+        )
+        requests = [factory.get(f'/s/{code}/') for code in sample]
+
+        for code in codes:
+            forget(code)
+        local_cache.clear()
+        for label, use_cache in (('Без кэша', False), ('С кэшем', True)):
+            view = ShortLinkViewSet.as_view(use_cache=use_cache)
+            start = time.perf_counter()
+            for request, code in zip(requests, sample):
+                view(request, short_link=code)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{label}: {len(requests) / elapsed:.0f} запросов в секунду'
+            )
@@ -0,0 +1,75 @@
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.authentication import CachedTokenAuthentication, forget, local_cache
+from api.views import UserViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Measures /api/users/me/ requests per second with the default '
+            'and the cached token authentication')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=100,
+                            help='How many distinct tokens are used')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(is_active=True)[:options['users']])
+        if not users:
+            raise CommandError('Нет пользователей: сначала создайте данные.')
+        # Токены, созданные для замера, откатываются вместе с транзакцией,
+        # а их записи удаляются из кэшей.
+        with transaction.atomic():
+            keys = [Token.objects.get_or_create(user=user)[0].key
+                    for user in users]
+            try:
+                self.benchmark(keys, options)
+            finally:
+                for key in keys:
+                    forget(key)
+                local_cache.clear()
+            transaction.set_rollback(True)
+
+    def benchmark(self, keys, options):
+        rng = random.Random(options['seed'])
+        # Активность пользователей распределена по закону Ципфа.
+        weights = [1 / rank for rank in range(1, len(keys) + 1)]
+        sample = rng.choices(keys, weights, k=options['requests'])
+        factory = RequestFactory(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0].lstrip('.*') or 'localhost'
+        )
+        requests = [
+            factory.get('/api/users/me/', HTTP_AUTHORIZATION=f'Token {key}')
+            for key in sample
+        ]
+
+        for key in keys:
+            forget(key)
+        local_cache.clear()
+        for label, authentication in (
+            ('TokenAuthentication', TokenAuthentication),
+            ('CachedTokenAuthentication', CachedTokenAuthentication),
+        ):
+            view = UserViewSet.as_view(
+                {'get': 'me'}, authentication_classes=(authentication, )
+            )
+            start = time.perf_counter()
+            for request in requests:
+                response = view(request)
+                response.render()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{label}: {len(requests) / elapsed:.0f} запросов в секунду'
+            )
@@ -0,0 +1,67 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from foodgram.image_variants import (AVATAR_VARIANTS, RECIPE_VARIANTS,
+                                     generate_variants)
+from foodgram.models import Recipe
+
+User = get_user_model()
+
+
+def generate(task):
+    """Выполняется в дочернем процессе: (путь, варианты, force)."""
+    name, variants, force = task
+    try:
+        return name, generate_variants(name, variants, force=force), None
+    except Exception as error:
+        return name, False, f'{type(error).__name__}: {error}'
+
+
+class Command(BaseCommand):
+    help = 'Generates missing resized variants of recipe images and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of worker processes')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate existing variants')
+        parser.add_argument('--chunksize', type=int, default=16,
+                            help='Images sent to a worker at once')
+
+    def handle(self, *args, **options):
+        tasks = list(chain(
+            ((name, RECIPE_VARIANTS, options['force'])
+             for name in Recipe.objects.exclude(image='').values_list(
+                 'image', flat=True).iterator()),
+            ((name, AVATAR_VARIANTS, options['force'])
+             for name in User.objects.exclude(avatar='').values_list(
+                 'avatar', flat=True).iterator()),
+        ))
+        # Дочерним процессам база не нужна: не наследуем соединения.
+        connections.close_all()
+        start = time.perf_counter()
+        created = skipped = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for name, generated, error in pool.map(
+                generate, tasks, chunksize=options['chunksize']
+            ):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                elif generated:
+                    created += 1
+                else:
+                    skipped += 1
+        elapsed = time.perf_counter() - start
+        total = created + skipped + failed
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображений: {total}, создано {created}, уже были {skipped}, '
+            f'ошибок {failed} за {elapsed:.1f} с, '
+            f'{total / elapsed if elapsed else 0:.1f} изображений/с'
+        ))
@@ -1,45 +1,201 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
 
-from foodgram.models import Ingredient
+from foodgram import caching, response_cache
+from foodgram.ingredient_index import ingredient_index
+from foodgram.models import Ingredient, Recipe
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) != 2:
+            yield None
+            continue
+        yield row
+
+
+def read_json(file):
+    """Объекты из JSON-массива или JSON Lines без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position = '', 0
+    while True:
+        # Пропускаем разделители между объектами массива.
+        while position < len(buffer) and buffer[position] in ' \t\r\n[],':
+            position += 1
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                if buffer[position:].strip():
+                    raise CommandError(
+                        f'Некорректный JSON: {buffer[position:][:100]}'
+                    )
+                return
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if isinstance(item, dict):
+            yield item.get('name'), item.get('measurement_unit')
+        else:
+            yield None
+
+
+READERS = {'csv': read_csv, 'json': read_json}
 
 
 class Command(BaseCommand):
-    help = 'Loads ingredients from a CSV file'
+    help = 'Loads ingredients from a CSV or JSON file'
 
-    def handle(self, *args, **kwargs):
-        file_path = os.path.join('foodgram/management/ingredients.csv')
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=os.path.join(settings.BASE_DIR, 'foodgram', 'management',
+                                 'ingredients.csv'),
+            help='CSV rows "name,unit" or JSON objects with name and '
+                 'measurement_unit'
+        )
+        parser.add_argument('--format', choices=READERS,
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Correct the measurement unit of ingredients that already '
+                 'exist under another unit'
+        )
 
+    def handle(self, *args, **options):
+        file_path = options['file']
         if not os.path.exists(file_path):
-            self.stdout.write(self.style.ERROR(
-                f'Файл не найден: {file_path}')
+            raise CommandError(f'Файл не найден: {file_path}')
+        file_format = (options['format']
+                       or os.path.splitext(file_path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла: {file_path}. Укажите --format.'
             )
-            return
-        ingredients_to_create = []
-        with open(file_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                if len(row) != 2:
+
+        self.stats = dict.fromkeys(
+            ('read', 'created', 'updated', 'skipped'), 0
+        )
+        self.updated_ids = []
+        self.verbosity = options['verbosity']
+        start = time.perf_counter()
+        with open(file_path, newline='', encoding='utf-8') as file:
+            rows = READERS[file_format](file)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.load_batch(batch, options['update'])
+        if self.stats['created'] or self.stats['updated']:
+            ingredient_index.invalidate()
+            if not caching.is_shared():
+                self.stderr.write(self.style.WARNING(
+                    caching.LOCAL_CACHE_WARNING
+                ))
+        if self.updated_ids:
+            Recipe.objects.filter(ingredients__in=self.updated_ids).touch()
+            response_cache.bump(response_cache.LIST, response_cache.CATALOG)
+        elapsed = time.perf_counter() - start
+
+        stats = self.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {stats["read"]}, добавлено {stats["created"]}, '
+            f'исправлено {stats["updated"]}, пропущено {stats["skipped"]} '
+            f'строк за {elapsed:.2f} с, '
+            f'{stats["read"] / elapsed if elapsed else 0:.0f} строк/с'
+        ))
+
+    def load_batch(self, batch, update):
+        units = {}
+        for row in batch:
+            self.stats['read'] += 1
+            if row is None or not all(isinstance(value, str)
+                                      for value in row):
+                self.stats['skipped'] += 1
+                if self.verbosity > 1:
                     self.stdout.write(self.style.WARNING(
-                        f'Неверный формат строки: {row}')
-                    )
+                        f'Неверный формат строки: {row}'
+                    ))
+                continue
+            name, measurement_unit = (value.strip() for value in row)
+            units.setdefault(name, set()).add(measurement_unit)
+
+        existing = {}
+        for ingredient in Ingredient.objects.filter(
+            name__in=units
+        ).order_by('pk'):
+            existing.setdefault(ingredient.name, []).append(ingredient)
+
+        to_create, to_update = [], []
+        for name, measurement_units in units.items():
+            known = existing.get(name, [])
+            new_units = measurement_units - {
+                ingredient.measurement_unit for ingredient in known
+            }
+            if update and known and len(measurement_units) == 1 and new_units:
+                if len(known) > 1:
+                    # Неясно, какую из единиц исправлять.
+                    self.stats['skipped'] += 1
+                    if self.verbosity > 1:
+                        self.stdout.write(self.style.WARNING(
+                            f'Несколько единиц у ингредиента: {name}'
+                        ))
                     continue
-                name, measurement_unit = row
-                ingredients_to_create.append(
-                    Ingredient(
-                        name=name.strip(),
-                        measurement_unit=measurement_unit.strip()
-                    )
-                )
-            if ingredients_to_create:
-                created_ingredients = Ingredient.objects.bulk_create(
-                    ingredients_to_create, ignore_conflicts=True
-                )
+                ingredient = known[0]
+                ingredient.measurement_unit = new_units.pop()
+                to_update.append(ingredient)
+            to_create.extend(
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for measurement_unit in sorted(new_units)
+            )
 
-                for ingredient in created_ingredients:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Ингредиент добавлен: {ingredient.name}')
-                    )
-            self.stdout.write(self.style.WARNING('Обработка завершена!'))
+        with transaction.atomic():
+            inserted = self.insert(to_create)
+            Ingredient.objects.bulk_update(to_update, ('measurement_unit', ))
+        self.stats['created'] += inserted
+        # Строки, которые успел добавить другой процесс.
+        self.stats['skipped'] += len(to_create) - inserted
+        self.stats['updated'] += len(to_update)
+        self.updated_ids.extend(ingredient.pk for ingredient in to_update)
+
+    @staticmethod
+    def insert(ingredients):
+        """Вставляет ингредиенты, пропуская уже существующие, и
+        возвращает число вставленных строк.
+
+        bulk_create(ignore_conflicts=True) этого числа не сообщает.
+        """
+        if not ingredients:
+            return 0
+        connection = connections[router.db_for_write(Ingredient)]
+        quote = connection.ops.quote_name
+        opts = Ingredient._meta
+        columns = ', '.join(quote(opts.get_field(name).column)
+                            for name in ('name', 'measurement_unit'))
+        batch_size = connection.ops.bulk_batch_size(['name', 'unit'],
+                                                    ingredients)
+        inserted = 0
+        with connection.cursor() as cursor:
+            for start in range(0, len(ingredients), batch_size):
+                batch = ingredients[start:start + batch_size]
+                cursor.execute(
+                    f'INSERT INTO {quote(opts.db_table)} ({columns}) VALUES '
+                    + ', '.join(['(%s, %s)'] * len(batch))
+                    + ' ON CONFLICT DO NOTHING',
+                    [value for ingredient in batch
+                     for value in (ingredient.name,
+                                   ingredient.measurement_unit)]
+                )
+                inserted += cursor.rowcount
+        return inserted
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.models import ShoppingListIngredient
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds ShoppingListIngredient from shopping carts '
+            'and verifies it against the live aggregate')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare the table with the live aggregate'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            start = time.perf_counter()
+            ShoppingListIngredient.objects.rebuild(
+                batch_size=options['batch_size']
+            )
+            self.stdout.write(
+                f'Таблица пересчитана за {time.perf_counter() - start:.2f} с'
+            )
+
+        stored = set(ShoppingListIngredient.objects.values_list(
+            'user_id', 'ingredient_id', 'total_amount'
+        ).iterator())
+        live = set(ShoppingListIngredient.objects.live_totals().iterator())
+        missing, extra = live - stored, stored - live
+        if missing or extra:
+            raise CommandError(
+                f'Расхождение с корзинами: отсутствует {len(missing)}, '
+                f'лишних {len(extra)} строк.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок совпадают с корзинами: {len(stored)} строк.'
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram import caching, response_cache
+
+
+class Command(BaseCommand):
+    help = 'Shows hit/miss counters of the anonymous response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Reset the counters after showing them')
+        parser.add_argument('--invalidate', action='store_true',
+                            help='Drop all cached responses')
+
+    def handle(self, *args, **options):
+        # Счётчики и версии ведут процессы сервера: команда видит их
+        # только через общий кэш.
+        if not caching.is_shared():
+            raise CommandError(caching.LOCAL_CACHE_WARNING)
+        stats = response_cache.stats()
+        total = stats['hits'] + stats['misses']
+        self.stdout.write(
+            f'Попаданий {stats["hits"]}, промахов {stats["misses"]}, '
+            f'доля попаданий {stats["hits"] / total if total else 0:.1%}'
+        )
+        if options['reset']:
+            response_cache.reset_stats()
+        if options['invalidate']:
+            response_cache.bump(response_cache.LIST, response_cache.CATALOG)
+            self.stdout.write('Кэш ответов сброшен.')
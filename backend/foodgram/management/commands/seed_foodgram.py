@@ -0,0 +1,326 @@
+import csv
+import io
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from foodgram import caching, response_cache
+from foodgram.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                             ShoppingList, ShoppingListIngredient, Tag)
+from foodgram.recipe_index import recipe_index
+from foodgram.short_codes import code_length, encode_code
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_dates(model):
+    """bulk_create сохраняет заданные даты полей auto_now и
+    auto_now_add: иначе все строки получили бы текущее время."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Zipf:
+    """Ранги 0..count-1 с вероятностью примерно 1 / (ранг + 1) ** exponent.
+
+    Ранг получается обратной функцией непрерывного приближения
+    распределения, поэтому память не зависит от count.
+    """
+
+    def __init__(self, rng, count, exponent):
+        self.rng = rng
+        self.count = count
+        self.exponent = exponent
+
+    def __call__(self):
+        if self.exponent == 1:
+            rank = (self.count + 1) ** self.rng.random()
+        else:
+            power = 1 - self.exponent
+            rank = (
+                ((self.count + 1) ** power - 1) * self.rng.random() + 1
+            ) ** (1 / power)
+        return min(int(rank), self.count) - 1
+
+    def distinct(self, count, exclude=None):
+        """Не более count различных рангов, кроме exclude."""
+        count = min(count, self.count // 2)
+        chosen = set()
+        while len(chosen) < count:
+            rank = self()
+            if rank != exclude:
+                chosen.add(rank)
+        return sorted(chosen)
+
+
+class Command(BaseCommand):
+    help = ('Generates a synthetic dataset for load testing: users, recipes, '
+            'recipe ingredients, favorites, carts and subscriptions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=50000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Average favorites per user')
+        parser.add_argument('--carts', type=int, default=3,
+                            help='Average shopping cart recipes per user')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Average subscriptions per user')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Popularity skew of authors and recipes')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=365,
+                            help='Period the registrations and recipes '
+                                 'are spread over')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='foodgram',
+                            help='Password of every generated user')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Use bulk_create instead of COPY '
+                                 'on PostgreSQL')
+
+    def handle(self, *args, **options):
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        if not self.ingredient_ids:
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните load_ingredients.'
+            )
+        self.tag_ids = list(
+            Tag.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.use_copy = (connection.vendor == 'postgresql'
+                         and not options['no_copy'])
+        self.rng = random.Random(options['seed'])
+        # Популярные ингредиенты не должны идти подряд по алфавиту.
+        self.rng.shuffle(self.ingredient_ids)
+        self.now = timezone.now()
+
+        # Первичные ключи назначаются заранее: связи строятся без
+        # чтения вставленных строк, а код короткой ссылки - из pk.
+        self.first_user = (User.objects.aggregate(pk=Max('pk'))['pk']
+                           or 0) + 1
+        self.first_recipe = (Recipe.objects.aggregate(pk=Max('pk'))['pk']
+                             or 0) + 1
+        self.authors = Zipf(self.rng, options['users'], options['zipf'])
+        self.recipes = Zipf(self.rng, options['recipes'], options['zipf'])
+        self.ingredients = Zipf(self.rng, len(self.ingredient_ids),
+                                options['zipf'])
+
+        start = time.perf_counter()
+        total = 0
+        with transaction.atomic():
+            for label, model, fields, rows in (
+                ('Пользователи', User, (
+                    'id', 'email', 'username', 'first_name', 'last_name',
+                    'password', 'is_active', 'is_staff', 'is_superuser',
+                    'date_joined', 'avatar'
+                ), self.user_rows()),
+                ('Рецепты', Recipe, (
+                    'id', 'author_id', 'name', 'image', 'text',
+                    'cooking_time', 'pub_date', 'updated_at', 'uniq_code'
+                ), self.recipe_rows()),
+                ('Ингредиенты рецептов', RecipeIngredient, (
+                    'recipe_id', 'ingredient_id', 'amount'
+                ), self.recipe_ingredient_rows()),
+                ('Теги рецептов', Recipe.tags.through, (
+                    'recipe_id', 'tag_id'
+                ), self.recipe_tag_rows()),
+                ('Избранное', Favorites, (
+                    'user_id', 'favorites_id'
+                ), self.user_recipe_rows(options['favorites'])),
+                ('Списки покупок', ShoppingList, (
+                    'user_id', 'recipe_id'
+                ), self.user_recipe_rows(options['carts'])),
+                ('Подписки', Subscriptions, (
+                    'user_id', 'following_id'
+                ), self.subscription_rows()),
+            ):
+                total += self.measure(label, self.insert, model, fields, rows)
+                if model in (User, Recipe):
+                    self.reset_sequence(model)
+            total += self.measure(
+                'Суммы списков покупок', self.rebuild_shopping_lists
+            )
+        recipe_index.invalidate()
+        response_cache.bump(response_cache.LIST, response_cache.CATALOG)
+        if not caching.is_shared():
+            self.stderr.write(self.style.WARNING(caching.LOCAL_CACHE_WARNING))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего {total} строк за {elapsed:.1f} с, '
+            f'{total / elapsed:.0f} строк/с'
+        ))
+
+    def measure(self, label, func, *args):
+        start = time.perf_counter()
+        count = func(*args)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label}: {count} строк за {elapsed:.1f} с, '
+            f'{count / elapsed if elapsed else 0:.0f} строк/с'
+        )
+        return count
+
+    def insert(self, model, fields, rows):
+        """Вставляет строки пачками: COPY на PostgreSQL, иначе
+        bulk_create."""
+        count = 0
+        for batch in batches(rows, self.batch_size):
+            if self.use_copy:
+                self.copy(model, fields, batch)
+            else:
+                with explicit_dates(model):
+                    model.objects.bulk_create(
+                        model(**dict(zip(fields, row))) for row in batch
+                    )
+            count += len(batch)
+        return count
+
+    @staticmethod
+    def copy(model, fields, rows):
+        buffer = io.StringIO()
+        # Строки в кавычках, чтобы пустая строка не стала NULL.
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(field).column)
+            for field in fields
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+                f'({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+
+    @staticmethod
+    def reset_sequence(model):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(),
+                                                         [model]):
+                cursor.execute(sql)
+
+    def rebuild_shopping_lists(self):
+        ShoppingListIngredient.objects.rebuild(batch_size=self.batch_size)
+        return ShoppingListIngredient.objects.count()
+
+    def user_ids(self):
+        return range(self.first_user, self.first_user + self.options['users'])
+
+    def recipe_ids(self):
+        return range(self.first_recipe,
+                     self.first_recipe + self.options['recipes'])
+
+    def activity(self, mean):
+        """Число действий пользователя: немногие активны, многие нет."""
+        return int(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def moments(self, count):
+        """count неубывающих моментов за последние --days дней.
+
+        Шаг с разбросом внутри шага: порядок по времени совпадает с
+        порядком pk, как у auto_now_add, и у каждого автора тоже.
+        """
+        step = self.options['days'] * 86400 / max(count, 1)
+        start = self.now - timedelta(days=self.options['days'])
+        for index in range(count):
+            yield start + timedelta(
+                seconds=int((index + self.rng.random()) * step)
+            )
+
+    def user_rows(self):
+        password = make_password(self.options['password'])
+        for pk, joined in zip(self.user_ids(),
+                              self.moments(self.options['users'])):
+            yield (pk, f'load{pk}@example.com', f'load{pk}', 'Имя',
+                   'Фамилия', password, True, False, False, joined, '')
+
+    def recipe_rows(self):
+        moments = self.moments(self.options['recipes'])
+        for pks in batches(self.recipe_ids(), self.batch_size):
+            codes = {pk: encode_code(pk) for pk in pks}
+            # Вычисленный код может совпасть только со старым случайным
+            # кодом из 4 символов: одна проверка на пачку, а не на строку.
+            taken = set(Recipe.objects.filter(
+                uniq_code__in=codes.values()
+            ).values_list('uniq_code', flat=True))
+            for pk in pks:
+                code = codes[pk]
+                if code in taken:
+                    code = encode_code(pk, code_length(pk) + 1)
+                pub_date = next(moments)
+                # Часть рецептов редактировали после публикации.
+                updated_at = pub_date
+                if self.rng.random() < 0.2:
+                    updated_at += (self.now - pub_date) * self.rng.random()
+                yield (pk, self.first_user + self.authors(), f'Рецепт {pk}',
+                       '', f'Описание рецепта {pk}.',
+                       self.rng.randint(5, 180), pub_date, updated_at, code)
+
+    def recipe_ingredient_rows(self):
+        per_recipe = self.options['ingredients_per_recipe']
+        for pk in self.recipe_ids():
+            count = self.rng.randint(1, max(1, 2 * per_recipe - 1))
+            for rank in self.ingredients.distinct(count):
+                yield (pk, self.ingredient_ids[rank],
+                       self.rng.randint(1, 500))
+
+    def recipe_tag_rows(self):
+        if not self.tag_ids:
+            return
+        per_recipe = min(self.options['tags_per_recipe'], len(self.tag_ids))
+        for pk in self.recipe_ids():
+            count = self.rng.randint(1, max(1, per_recipe))
+            for tag_id in sorted(self.rng.sample(self.tag_ids, count)):
+                yield pk, tag_id
+
+    def user_recipe_rows(self, mean):
+        for pk in self.user_ids():
+            for rank in self.recipes.distinct(self.activity(mean)):
+                yield pk, self.first_recipe + rank
+
+    def subscription_rows(self):
+        for pk in self.user_ids():
+            for rank in self.authors.distinct(
+                self.activity(self.options['subscriptions']),
+                exclude=pk - self.first_user
+            ):
+                yield pk, self.first_user + rank
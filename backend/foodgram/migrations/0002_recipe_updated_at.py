@@ -0,0 +1,20 @@
+# Generated by Django 3.2.16 on 2026-10-17 10:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='дата изменения рецепта'),
+            preserve_default=False,
+        ),
+    ]
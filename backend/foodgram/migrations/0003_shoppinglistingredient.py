@@ -0,0 +1,53 @@
+# Generated by Django 3.2.16 on 2026-10-17 03:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_list_ingredients(apps, schema_editor):
+    RecipeIngredient = apps.get_model('foodgram', 'RecipeIngredient')
+    ShoppingListIngredient = apps.get_model('foodgram',
+                                            'ShoppingListIngredient')
+    totals = RecipeIngredient.objects.filter(
+        recipe__carts__isnull=False
+    ).order_by().values_list(
+        'recipe__carts__user', 'ingredient'
+    ).annotate(total_amount=models.Sum('amount'))
+    ShoppingListIngredient.objects.bulk_create(
+        (ShoppingListIngredient(user_id=user_id, ingredient_id=ingredient_id,
+                                total_amount=total_amount)
+         for user_id, ingredient_id, total_amount in totals.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0002_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_ingredients', to='foodgram.ingredient', verbose_name='ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списка покупок',
+                'default_related_name': 'shopping_list_ingredients',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_list_ingredients,
+                             migrations.RunPython.noop),
+    ]
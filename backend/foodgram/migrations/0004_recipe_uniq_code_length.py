@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-17 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0003_shoppinglistingredient'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='uniq_code',
+            field=models.CharField(blank=True, max_length=8, null=True, unique=True, verbose_name='код для короткой ссылки'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.16 on 2026-10-17 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0004_recipe_uniq_code_length'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='favorites',
+            options={'default_related_name': 'favorites', 'verbose_name': 'Избранное', 'verbose_name_plural': 'Избранное'},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'verbose_name': 'Ингредиент', 'verbose_name_plural': 'Ингредиенты'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'default_related_name': 'recipes', 'ordering': ('-pub_date', '-id'), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipeingredient',
+            options={'default_related_name': 'recipeingredient', 'verbose_name': 'Ингредиент в рецепте', 'verbose_name_plural': 'Ингредиенты в рецепте'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppinglist',
+            options={'default_related_name': 'carts', 'verbose_name': 'Список покупок', 'verbose_name_plural': 'Список покупок'},
+        ),
+        migrations.AlterModelOptions(
+            name='tag',
+            options={'verbose_name': 'Тег', 'verbose_name_plural': 'Теги'},
+        ),
+        migrations.AddIndex(
+            model_name='favorites',
+            index=models.Index(fields=['favorites', 'user'], name='favorites_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['pub_date', 'id'], name='recipe_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'pub_date', 'id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['recipe', 'user'], name='shoppinglist_recipe_user_idx'),
+        ),
+    ]
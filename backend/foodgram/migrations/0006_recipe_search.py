@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from foodgram import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0005_remove_orderings_add_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
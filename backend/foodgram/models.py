@@ -1,11 +1,15 @@
-import random
-import string
+from itertools import islice
 
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import (IntegrityError, connections, models, router,
+                       transaction)
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
 from foodgram import constant
+from foodgram.short_codes import code_length, encode_code
 
 User = get_user_model()
 
@@ -22,7 +26,6 @@ class Ingredient(models.Model):
     )
 
     class Meta:
-        ordering = ('-name', )
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         constraints = [
@@ -48,7 +51,6 @@ class Tag(models.Model):
     )
 
     class Meta:
-        ordering = ('-name', )
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
 
@@ -56,6 +58,52 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы к рецептам."""
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги избранного и списка покупок пользователя."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorites.objects.filter(
+                user=user, favorites=models.OuterRef('pk')
+            )),
+            is_in_shopping_cart=models.Exists(ShoppingList.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+        )
+
+    def first_per_author(self, limit):
+        """Оставляет не более limit последних рецептов каждого автора.
+
+        Нумерация строк окном ROW_NUMBER() по автору выполняется в базе,
+        поэтому лишние рецепты не передаются в приложение.
+        """
+        ranked = self.order_by().annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=models.F('author'),
+            order_by=(models.F('pub_date').desc(), models.F('pk').desc()),
+        )).values('pk', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
+
+    def touch(self):
+        """Отмечает рецепты изменёнными для условных GET-запросов."""
+        return self.update(updated_at=timezone.now())
+
+
 class Recipe(models.Model):
     """Модель рецептов."""
     author = models.ForeignKey(
@@ -98,34 +146,63 @@ class Recipe(models.Model):
         verbose_name='дата создания рецепта',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='дата изменения рецепта',
+        auto_now=True
+    )
     uniq_code = models.CharField(
         verbose_name='код для короткой ссылки',
         max_length=constant.MAX_UNIQ_CODE,
         unique=True,
-        blank=True
+        blank=True,
+        null=True
     )
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
-        ordering = ('-pub_date', )
+        ordering = ('-pub_date', '-id')
         default_related_name = 'recipes'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=('pub_date', 'id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', 'pub_date', 'id'),
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
-    def generate_unique_code(self):
-        characters = string.ascii_letters + string.digits
+    def ingredient_amounts(self):
+        """Количество ингредиентов рецепта: {ingredient_id: amount}."""
+        return dict(
+            self.recipeingredient.values_list('ingredient_id', 'amount')
+        )
+
+    def assign_uniq_code(self):
+        """Назначает код короткой ссылки, вычисленный по pk.
+
+        Код 4 символа из старых случайных может совпасть с вычисленным;
+        тогда берётся код большей длины, который совпасть уже не может.
+        """
+        length = code_length(self.pk)
         while True:
-            code = ''.join(random.choices(characters,
-                                          k=constant.MAX_UNIQ_CODE))
-            if not Recipe.objects.filter(uniq_code=code).exists():
-                return code
+            code = encode_code(self.pk, length)
+            try:
+                with transaction.atomic():
+                    Recipe.objects.filter(pk=self.pk).update(uniq_code=code)
+            except IntegrityError:
+                length += 1
+                continue
+            self.uniq_code = code
+            return
 
     def save(self, *args, **kwargs):
-        if not self.uniq_code:
-            self.uniq_code = self.generate_unique_code()
         super().save(*args, **kwargs)
+        if not self.uniq_code:
+            self.assign_uniq_code()
 
 
 class RecipeIngredient(models.Model):
@@ -153,7 +230,6 @@ class RecipeIngredient(models.Model):
     )
 
     class Meta:
-        ordering = ('-recipe__pub_date', )
         default_related_name = 'recipeingredient'
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
@@ -182,7 +258,6 @@ class Favorites(models.Model):
     )
 
     class Meta:
-        ordering = ('-favorites__pub_date', )
         default_related_name = 'favorites'
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
@@ -190,6 +265,10 @@ class Favorites(models.Model):
             models.UniqueConstraint(fields=('user', 'favorites'),
                                     name='unique_user_favorite')
         ]
+        indexes = [
+            models.Index(fields=('favorites', 'user'),
+                         name='favorites_recipe_user_idx'),
+        ]
 
     def __str__(self):
         return self.favorites.name
@@ -209,7 +288,6 @@ class ShoppingList(models.Model):
     )
 
     class Meta:
-        ordering = ('-recipe__pub_date', )
         default_related_name = 'carts'
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
@@ -217,7 +295,141 @@ class ShoppingList(models.Model):
             models.UniqueConstraint(fields=('user', 'recipe'),
                                     name='unique_user_recipe')
         ]
+        indexes = [
+            models.Index(fields=('recipe', 'user'),
+                         name='shoppinglist_recipe_user_idx'),
+        ]
 
     def __str__(self):
         return (f'{self.user.username} добавил '
                 f'рецепт {self.recipe.name} в список покупок.')
+
+
+class ShoppingListIngredientManager(models.Manager):
+    """Поддержка сумм ингредиентов списка покупок в актуальном виде."""
+
+    def apply(self, user_ids, deltas):
+        """Прибавляет deltas ({ingredient_id: количество}) к суммам
+        каждого из пользователей user_ids."""
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        with transaction.atomic():
+            rows = {
+                (row.user_id, row.ingredient_id): row
+                for row in self.select_for_update().filter(
+                    user_id__in=user_ids, ingredient_id__in=deltas
+                )
+            }
+            to_create, to_update, to_delete = [], [], []
+            for user_id in user_ids:
+                for ingredient_id, delta in deltas.items():
+                    row = rows.get((user_id, ingredient_id))
+                    if row is None:
+                        if delta > 0:
+                            to_create.append((user_id, ingredient_id, delta))
+                    elif row.total_amount + delta > 0:
+                        row.total_amount += delta
+                        to_update.append(row)
+                    else:
+                        to_delete.append(row.pk)
+            self.add(to_create)
+            self.bulk_update(to_update, ('total_amount', ))
+            if to_delete:
+                self.filter(pk__in=to_delete).delete()
+
+    def add(self, rows):
+        """Вставляет строки (user_id, ingredient_id, количество) или
+        прибавляет количество к уже существующим.
+
+        Отсутствующую строку нельзя заблокировать select_for_update:
+        параллельная транзакция может вставить её же, и bulk_create
+        нарушил бы unique_user_ingredient. ON CONFLICT складывает
+        количества в базе.
+        """
+        if not rows:
+            return
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        table = quote(opts.db_table)
+        columns = [quote(opts.get_field(name).column)
+                   for name in ('user', 'ingredient', 'total_amount')]
+        batch_size = connection.ops.bulk_batch_size(columns, rows)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                cursor.execute(
+                    f'INSERT INTO {table} ({", ".join(columns)}) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(batch))
+                    + f' ON CONFLICT ({columns[0]}, {columns[1]}) DO UPDATE'
+                    f' SET {columns[2]} = {table}.{columns[2]}'
+                    f' + EXCLUDED.{columns[2]}',
+                    [value for row in batch for value in row]
+                )
+
+    def live_totals(self, user_ids=None):
+        """Суммы, посчитанные заново по корзинам и рецептам."""
+        queryset = RecipeIngredient.objects.filter(recipe__carts__isnull=False)
+        if user_ids is not None:
+            queryset = queryset.filter(recipe__carts__user_id__in=user_ids)
+        return queryset.order_by().values_list(
+            'recipe__carts__user', 'ingredient'
+        ).annotate(total_amount=models.Sum('amount'))
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        """Пересчитывает суммы всех или указанных пользователей."""
+        with transaction.atomic():
+            queryset = self.all()
+            if user_ids is not None:
+                user_ids = list(user_ids)
+                queryset = queryset.filter(user_id__in=user_ids)
+            queryset.delete()
+            totals = self.live_totals(user_ids).iterator()
+            while True:
+                batch = [
+                    self.model(user_id=user_id, ingredient_id=ingredient_id,
+                               total_amount=total_amount)
+                    for user_id, ingredient_id, total_amount
+                    in islice(totals, batch_size)
+                ]
+                if not batch:
+                    break
+                self.bulk_create(batch)
+
+
+class ShoppingListIngredient(models.Model):
+    """Сумма ингредиента по всем рецептам в списке покупок пользователя.
+
+    Обновляется при добавлении и удалении рецептов из списка покупок
+    и при изменении ингредиентов рецептов, которые в нём находятся.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='пользователь',
+        on_delete=models.CASCADE
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='ингредиент',
+        on_delete=models.CASCADE
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='общее количество'
+    )
+
+    objects = ShoppingListIngredientManager()
+
+    class Meta:
+        default_related_name = 'shopping_list_ingredients'
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списка покупок'
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='unique_user_ingredient')
+        ]
+
+    def __str__(self):
+        return (f'{self.total_amount}{self.ingredient.measurement_unit} '
+                f'{self.ingredient.name} у {self.user.username}')
@@ -0,0 +1,164 @@
+import bisect
+import heapq
+import threading
+from array import array
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from foodgram import caching
+from foodgram.models import RecipeIngredient
+
+VERSION_CACHE_KEY = 'recipe_index_version'
+CHANGES_CACHE_KEY = 'recipe_index_changes:{}'
+CHANGES_TIMEOUT = 3600
+# Если изменений накопилось больше, индекс дешевле построить заново.
+MAX_PENDING_CHANGES = 1000
+
+
+def grow(sizes, recipe_id):
+    if recipe_id >= len(sizes):
+        sizes.extend(array('H', bytes(2 * (recipe_id + 1 - len(sizes)))))
+
+
+class RankedRecipes:
+    """Результаты поиска для Paginator.
+
+    Полностью упорядочиваются только элементы до конца запрошенной
+    страницы: (недостающих, -совпавших, -id рецепта).
+    """
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        stop = len(self) if index.stop is None else index.stop
+        return heapq.nsmallest(stop, self.candidates)[index]
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс: ингредиент -> отсортированный массив id рецептов.
+
+    Записи сообщают об изменённых рецептах через notify(): номер версии
+    и список рецептов хранятся в общем кэше Django. Каждый процесс при поиске
+    перечитывает из базы только изменённые рецепты; если изменения
+    потеряны или их слишком много, индекс строится заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._sizes = None
+        self._version = None
+
+    def notify(self, recipe_ids):
+        """Отмечает рецепты, ингредиенты которых изменились."""
+        version = caching.bump_version(VERSION_CACHE_KEY)
+        cache.set(CHANGES_CACHE_KEY.format(version), list(recipe_ids),
+                  CHANGES_TIMEOUT)
+
+    def changed(self, recipe_ids):
+        """notify() после фиксации текущей транзакции."""
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(lambda: self.notify(recipe_ids))
+
+    def invalidate(self):
+        """Заставляет все процессы построить индекс заново."""
+        caching.bump_version(VERSION_CACHE_KEY)
+
+    def build(self):
+        """Строит индекс по таблице RecipeIngredient."""
+        with self._lock:
+            version = caching.get_version(VERSION_CACHE_KEY)
+            postings, sizes = {}, array('H')
+            # Строки идут по возрастанию recipe_id, массивы остаются
+            # отсортированными без дополнительной сортировки.
+            rows = RecipeIngredient.objects.order_by(
+                'recipe_id', 'ingredient_id'
+            ).values_list('recipe_id', 'ingredient_id').iterator()
+            for recipe_id, ingredient_id in rows:
+                posting = postings.get(ingredient_id)
+                if posting is None:
+                    posting = postings[ingredient_id] = array('q')
+                posting.append(recipe_id)
+                grow(sizes, recipe_id)
+                sizes[recipe_id] += 1
+            self._postings, self._sizes = postings, sizes
+            self._version = version
+
+    def _refresh(self, recipe_ids, version):
+        """Перечитывает ингредиенты рецептов recipe_ids из базы."""
+        current = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=current
+        ).values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].add(ingredient_id)
+        with self._lock:
+            # Массивы копируются при изменении: поиск в других потоках
+            # продолжает работать со старыми.
+            postings, sizes = dict(self._postings), array('H', self._sizes)
+            for recipe_id, ingredient_ids in current.items():
+                for ingredient_id, posting in self._postings.items():
+                    position = bisect.bisect_left(posting, recipe_id)
+                    present = (position < len(posting)
+                               and posting[position] == recipe_id)
+                    if present and ingredient_id not in ingredient_ids:
+                        posting = postings[ingredient_id] = array(
+                            'q', postings[ingredient_id]
+                        )
+                        del posting[bisect.bisect_left(posting, recipe_id)]
+                for ingredient_id in ingredient_ids:
+                    posting = postings.get(ingredient_id, array('q'))
+                    position = bisect.bisect_left(posting, recipe_id)
+                    if (position < len(posting)
+                            and posting[position] == recipe_id):
+                        continue
+                    posting = postings[ingredient_id] = array('q', posting)
+                    posting.insert(position, recipe_id)
+                grow(sizes, recipe_id)
+                sizes[recipe_id] = len(ingredient_ids)
+            self._postings, self._sizes = postings, sizes
+            self._version = version
+
+    def _get_snapshot(self):
+        version = caching.get_version(VERSION_CACHE_KEY)
+        if self._postings is None:
+            self.build()
+        elif self._version != version:
+            pending = range(self._version + 1, version + 1)
+            changes = {}
+            if 0 < len(pending) <= MAX_PENDING_CHANGES:
+                changes = cache.get_many(
+                    [CHANGES_CACHE_KEY.format(number) for number in pending]
+                )
+            if len(pending) and len(changes) == len(pending):
+                self._refresh(
+                    {pk for recipe_ids in changes.values()
+                     for pk in recipe_ids}, version
+                )
+            else:
+                self.build()
+        return self._postings, self._sizes
+
+    def search(self, ingredient_ids, max_missing):
+        """Рецепты, для которых не хватает не более max_missing
+        ингредиентов из ingredient_ids."""
+        postings, sizes = self._get_snapshot()
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            # Подсчёт по массиву выполняется в C, без цикла Python.
+            matched.update(postings.get(ingredient_id, ()))
+        return RankedRecipes([
+            (sizes[recipe_id] - count, -count, -recipe_id)
+            for recipe_id, count in matched.items()
+            if sizes[recipe_id] - count <= max_missing
+        ])
+
+
+recipe_index = RecipeIngredientIndex()
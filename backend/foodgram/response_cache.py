@@ -0,0 +1,80 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from foodgram import caching
+
+KEY_PREFIX = 'response_cache'
+VERSION_KEY = KEY_PREFIX + ':version:{}'
+STATS_KEYS = {'hits': KEY_PREFIX + ':hits', 'misses': KEY_PREFIX + ':misses'}
+# Версии: LIST - любые списки рецептов, CATALOG - теги, ингредиенты
+# и авторы внутри ответов, recipe:<id> - отдельный рецепт.
+LIST = 'list'
+CATALOG = 'catalog'
+
+
+def recipe_version(pk):
+    return f'recipe:{pk}'
+
+
+def get_versions(names):
+    return caching.get_versions([VERSION_KEY.format(name) for name in names])
+
+
+def bump(*names):
+    """Делает недействительными ответы, зависящие от версий names."""
+    for name in names:
+        caching.bump_version(VERSION_KEY.format(name))
+
+
+def recipe_changed(pk):
+    """Сбрасывает ответы с рецептом pk после фиксации транзакции."""
+    transaction.on_commit(lambda: bump(LIST, recipe_version(pk)))
+
+
+def catalog_changed():
+    """Сбрасывает все ответы после фиксации транзакции."""
+    transaction.on_commit(lambda: bump(LIST, CATALOG))
+
+
+def make_key(names, parts):
+    """Ключ ответа: текущие версии names и параметры запроса parts.
+
+    При изменении версии ключ меняется, а старые записи истекают сами,
+    поэтому перебирать ключи при сбросе не нужно.
+    """
+    digest = hashlib.md5(
+        repr((get_versions(names), parts)).encode()
+    ).hexdigest()
+    return f'{KEY_PREFIX}:{names[0]}:{digest}'
+
+
+def count(name):
+    key = STATS_KEYS[name]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def load(key):
+    value = cache.get(key)
+    count('misses' if value is None else 'hits')
+    return value
+
+
+def store(key, value):
+    cache.set(key, value, settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def stats():
+    """Счётчики попаданий и промахов всех процессов."""
+    values = cache.get_many(STATS_KEYS.values())
+    return {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    cache.delete_many(STATS_KEYS.values())
@@ -0,0 +1,148 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# Конфигурация PostgreSQL для разбора текста рецептов.
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'foodgram_recipe_fts'
+WORD = re.compile(r'\w+')
+
+POSTGRESQL_INSTALL = (
+    # Генерируемый столбец обновляет сама база при любой записи.
+    f"""ALTER TABLE foodgram_recipe ADD COLUMN IF NOT EXISTS search_vector
+    tsvector GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}',
+    coalesce(name, '') || ' ' || coalesce(text, ''))) STORED""",
+    """CREATE INDEX IF NOT EXISTS recipe_search_vector_idx
+    ON foodgram_recipe USING GIN (search_vector)""",
+)
+POSTGRESQL_UNINSTALL = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE foodgram_recipe DROP COLUMN IF EXISTS search_vector',
+)
+SQLITE_TABLE = (
+    # Внешнее содержимое: текст хранится только в foodgram_recipe.
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, text, content='foodgram_recipe', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2')""",
+)
+SQLITE_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON foodgram_recipe BEGIN
+    INSERT INTO {FTS_TABLE}(rowid, name, text)
+    VALUES (new.id, new.name, new.text); END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON foodgram_recipe BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+    VALUES ('delete', old.id, old.name, old.text); END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON foodgram_recipe BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+    VALUES ('delete', old.id, old.name, old.text);
+    INSERT INTO {FTS_TABLE}(rowid, name, text)
+    VALUES (new.id, new.name, new.text); END""",
+)
+SQLITE_REBUILD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+SQLITE_UNINSTALL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+def install(connection):
+    """Создаёт полнотекстовый индекс рецептов для базы connection."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            statements = POSTGRESQL_INSTALL
+        elif connection.vendor == 'sqlite':
+            statements = (*SQLITE_TABLE, *SQLITE_TRIGGERS, SQLITE_REBUILD)
+        else:
+            return
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def uninstall(connection):
+    statements = {
+        'postgresql': POSTGRESQL_UNINSTALL,
+        'sqlite': SQLITE_UNINSTALL,
+    }.get(connection.vendor, ())
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def restore_sqlite_triggers(connection):
+    """Возвращает триггеры FTS5 после пересоздания таблицы рецептов.
+
+    Миграции Django на SQLite меняют таблицу через копию, и триггеры
+    старой таблицы пропадают вместе с ней.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE %s",
+            (f'{FTS_TABLE}%', )
+        )
+        names = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in names or len(names & {
+            f'{FTS_TABLE}_insert', f'{FTS_TABLE}_delete',
+            f'{FTS_TABLE}_update'
+        }) == 3:
+            return
+        for sql in (*SQLITE_TRIGGERS, SQLITE_REBUILD):
+            cursor.execute(sql)
+
+
+def search_recipes(queryset, query, ranked=True):
+    """Рецепты queryset, в названии или описании которых есть query.
+
+    С ranked более релевантные рецепты идут первыми: ts_rank
+    на PostgreSQL, bm25() на SQLite; при равной релевантности
+    сохраняется порядок ленты.
+    """
+    vendor = connections[queryset.db].vendor
+    table = queryset.model._meta.db_table
+    if vendor == 'postgresql':
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT id FROM {table} WHERE search_vector '
+            '@@ websearch_to_tsquery(%s, %s)', (SEARCH_CONFIG, query)
+        ))
+        if not ranked:
+            return queryset
+        return order_by_rank(queryset, RawSQL(
+            f'ts_rank("{table}"."search_vector", '
+            'websearch_to_tsquery(%s, %s))', (SEARCH_CONFIG, query)
+        ).desc())
+    words = WORD.findall(query)
+    if not words:
+        return queryset.none()
+    if vendor == 'sqlite':
+        # Каждое слово - отдельный терм с поиском по префиксу.
+        match = ' '.join(f'"{word}"*' for word in words)
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match, )
+        ))
+        if not ranked:
+            return queryset
+        # bm25() отрицательна: чем меньше, тем релевантнее.
+        return order_by_rank(queryset, RawSQL(
+            f'(SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} '
+            f'MATCH %s AND rowid = "{table}"."id")', (match, )
+        ).asc())
+    for word in words:
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(text__icontains=word)
+        )
+    return queryset
+
+
+def order_by_rank(queryset, rank):
+    """Сортирует по релевантности, затем в порядке ленты."""
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    return queryset.order_by(rank, *ordering)
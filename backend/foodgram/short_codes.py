@@ -0,0 +1,74 @@
+import re
+import string
+
+from foodgram import constant
+
+ALPHABET = string.ascii_letters + string.digits
+BASE = len(ALPHABET)
+# Коды прежних случайных ссылок состоят из тех же символов.
+CODE_PATTERN = re.compile(
+    rf'[A-Za-z0-9]{{{constant.MIN_UNIQ_CODE},{constant.MAX_UNIQ_CODE}}}'
+)
+# Множитель взаимно прост с BASE ** length при любой длине
+# (нечётный и не кратен 31), поэтому каждый раунд обратим.
+MULTIPLIER = 2654435761
+OFFSET = 1540483477
+ROUNDS = 3
+
+
+def is_valid_code(code):
+    return CODE_PATTERN.fullmatch(code) is not None
+
+
+def code_length(pk):
+    """Наименьшая длина кода, в пространство которой помещается pk."""
+    length = constant.MIN_UNIQ_CODE
+    while pk >= BASE ** length:
+        length += 1
+    return length
+
+
+def to_digits(value, length):
+    digits = []
+    for _ in range(length):
+        value, digit = divmod(value, BASE)
+        digits.append(digit)
+    return digits
+
+
+def from_digits(digits):
+    value = 0
+    for digit in reversed(digits):
+        value = value * BASE + digit
+    return value
+
+
+def encode_code(pk, length=None):
+    """Код короткой ссылки для первичного ключа.
+
+    Раунды аффинного перемешивания и разворота цифр взаимно однозначно
+    отображают pk на пространство BASE ** length, поэтому разные pk
+    одной длины никогда не дают одинаковых кодов, а соседние pk
+    не дают похожих.
+    """
+    length = length or code_length(pk)
+    space = BASE ** length
+    if length > constant.MAX_UNIQ_CODE or pk >= space:
+        raise ValueError(f'Код для pk={pk} не помещается в {length} символов.')
+    value = pk
+    for _ in range(ROUNDS):
+        value = (value * MULTIPLIER + OFFSET) % space
+        value = from_digits(to_digits(value, length)[::-1])
+    return ''.join(ALPHABET[digit] for digit in to_digits(value, length))
+
+
+def decode_code(code):
+    """Первичный ключ, из которого получен код."""
+    length = len(code)
+    space = BASE ** length
+    inverse = pow(MULTIPLIER, -1, space)
+    value = from_digits([ALPHABET.index(char) for char in code])
+    for _ in range(ROUNDS):
+        value = from_digits(to_digits(value, length)[::-1])
+        value = (value - OFFSET) * inverse % space
+    return value
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.caching import LRUCache
+from foodgram.models import Recipe
+from foodgram.short_codes import is_valid_code
+
+CACHE_KEY = 'short_link:{}'
+
+
+local_cache = LRUCache(settings.SHORT_LINK_CACHE_SIZE,
+                       settings.SHORT_LINK_CACHE_TTL)
+
+
+def get_recipe_id(code, use_cache=True):
+    """id рецепта по коду короткой ссылки или None.
+
+    Сначала проверяется кэш процесса, затем общий кэш Django
+    и только потом база данных. Код другого формата в кэши не попадает:
+    memcached не принимает ключи с пробелами и длиннее 250 символов.
+    """
+    if not is_valid_code(code):
+        return None
+    if not use_cache:
+        return Recipe.objects.filter(
+            uniq_code=code
+        ).values_list('pk', flat=True).first()
+    recipe_id = local_cache.get(code)
+    if recipe_id is not None:
+        return recipe_id
+    recipe_id = cache.get(CACHE_KEY.format(code))
+    if recipe_id is None:
+        recipe_id = get_recipe_id(code, use_cache=False)
+        if recipe_id is None:
+            return None
+        cache.set(CACHE_KEY.format(code), recipe_id,
+                  settings.SHORT_LINK_CACHE_TIMEOUT)
+    local_cache.set(code, recipe_id)
+    return recipe_id
+
+
+def forget(code):
+    """Удаляет код из кэшей, например после удаления рецепта."""
+    local_cache.delete(code)
+    cache.delete(CACHE_KEY.format(code))
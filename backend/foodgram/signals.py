@@ -0,0 +1,147 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from foodgram.image_variants import (AVATAR_VARIANTS, RECIPE_VARIANTS,
+                                     delete_variants, generate_variants)
+from foodgram.ingredient_index import ingredient_index
+from foodgram import response_cache, search, tag_slugs
+from foodgram.models import Ingredient, Recipe, ShoppingListIngredient, Tag
+from foodgram.recipe_index import recipe_index
+from foodgram.short_links import forget
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+# Поле изображения модели и его варианты.
+IMAGE_FIELDS = {
+    Recipe: ('image', RECIPE_VARIANTS),
+    User: ('avatar', AVATAR_VARIANTS),
+}
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_index(sender, instance, **kwargs):
+    """Добавляет сохранённый ингредиент в индекс поиска."""
+    # Копия не зависит от последующих изменений экземпляра.
+    ingredient = Ingredient(pk=instance.pk, name=instance.name,
+                            measurement_unit=instance.measurement_unit)
+    transaction.on_commit(lambda: ingredient_index.update(ingredient))
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_from_ingredient_index(sender, instance, **kwargs):
+    """Удаляет ингредиент из индекса поиска."""
+    pk = instance.pk
+    transaction.on_commit(lambda: ingredient_index.remove(pk))
+    # Вместе с ингредиентом удалены строки рецептов, какие - неизвестно.
+    transaction.on_commit(recipe_index.invalidate)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_slugs(sender, **kwargs):
+    """Сбрасывает кэш соответствия слагов и id тегов."""
+    transaction.on_commit(tag_slugs.invalidate)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_shopping_lists(sender, instance, **kwargs):
+    """Вычитает удаляемый рецепт из списков покупок."""
+    ShoppingListIngredient.objects.apply(
+        instance.carts.values_list('user_id', flat=True),
+        {ingredient_id: -amount for ingredient_id, amount
+         in instance.ingredient_amounts().items()}
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_deleted_recipe(sender, instance, **kwargs):
+    """Удаляет рецепт из кэша коротких ссылок и индекса ингредиентов."""
+    code = instance.uniq_code
+    transaction.on_commit(lambda: forget(code))
+    recipe_index.changed([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_responses(sender, instance, **kwargs):
+    """Сбрасывает кэшированные ответы с рецептом."""
+    response_cache.recipe_changed(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_catalog_responses(sender, **kwargs):
+    """Названия тегов и ингредиентов входят в ответы с рецептами."""
+    response_cache.catalog_changed()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, created,
+                                update_fields=None, **kwargs):
+    """Данные автора входят в ответы с рецептами: меняются ETag его
+    рецептов и версия кэша ответов."""
+    if created or update_fields is not None and set(
+        update_fields
+    ) <= {'last_login'}:
+        return
+    Recipe.objects.filter(author=instance).touch()
+    response_cache.catalog_changed()
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """Подключается в FoodgramConfig.ready к post_migrate."""
+    search.restore_sqlite_triggers(connections[using])
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_image_name(sender, instance, **kwargs):
+    """Имя изображения до изменения: при замене и удалении оригинала
+    удаляются его варианты. Отложенное поле не загружается."""
+    field = IMAGE_FIELDS[sender][0]
+    value = instance.__dict__.get(field)
+    instance._stored_image_name = getattr(value, 'name', value) or ''
+
+
+def schedule_variants(instance, created, update_fields):
+    """Создаёт варианты нового изображения и удаляет варианты прежнего
+    после фиксации транзакции.
+
+    Генерация идёт в процессе запроса. Если она не удалась, ответы
+    ссылаются на оригинал, а варианты создаёт generate_image_variants.
+    """
+    field, variants = IMAGE_FIELDS[type(instance)]
+    if update_fields is not None and field not in update_fields:
+        return
+    image = getattr(instance, field)
+    name, storage = image.name or '', image.storage
+    stored_name = getattr(instance, '_stored_image_name', '')
+    instance._stored_image_name = name
+
+    def generate():
+        try:
+            if stored_name and stored_name != name and not created:
+                delete_variants(stored_name, variants, storage)
+            if name:
+                generate_variants(name, variants, storage)
+        except Exception:
+            # Оригинал уже сохранён; варианты создаст generate_image_variants.
+            logger.exception('Не удалось создать варианты %s', name)
+
+    transaction.on_commit(generate)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def update_image_variants(sender, instance, created, update_fields=None,
+                          **kwargs):
+    """Уменьшенные копии картинки рецепта и аватара."""
+    schedule_variants(instance, created, update_fields)
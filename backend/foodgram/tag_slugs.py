@@ -0,0 +1,24 @@
+from django.core.cache import cache
+
+from foodgram.models import Tag
+from foodgram_backend.db.replicas import use_primary
+
+CACHE_KEY = 'tag_slug_ids'
+
+
+def get_tag_ids():
+    """Словарь {slug: id} всех тегов из кэша Django.
+
+    Тегов немного и меняются они редко, поэтому фильтр рецептов
+    не обращается к таблице тегов на каждый запрос.
+    """
+    tag_ids = cache.get(CACHE_KEY)
+    if tag_ids is None:
+        with use_primary():
+            tag_ids = dict(Tag.objects.values_list('slug', 'pk'))
+        cache.set(CACHE_KEY, tag_ids, timeout=None)
+    return tag_ids
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
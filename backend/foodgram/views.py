@@ -1,12 +1,31 @@
-from django.shortcuts import get_object_or_404, redirect
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control
+from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 
-from foodgram.models import Recipe
+from foodgram.short_links import get_recipe_id
 
 
 class ShortLinkViewSet(APIView):
-    """Обработка коротких ссылок для рецептов."""
+    """Обработка коротких ссылок для рецептов.
+
+    Код разрешается через кэш без обращения к базе, а постоянный
+    редирект с заголовками кэширования позволяет nginx и браузерам
+    не запрашивать его повторно.
+    """
+    authentication_classes = ()
+    permission_classes = (AllowAny, )
+    replica_actions = ('get', )
+    use_cache = True
+
     def get(self, request, short_link=None):
-        recipe = get_object_or_404(Recipe, uniq_code=short_link)
-        full_url = request.build_absolute_uri(f'/recipes/{recipe.id}')
-        return redirect(full_url)
+        recipe_id = get_recipe_id(short_link, self.use_cache)
+        if recipe_id is None:
+            raise Http404('Рецепт не найден.')
+        full_url = request.build_absolute_uri(f'/recipes/{recipe_id}')
+        response = redirect(full_url, permanent=True)
+        patch_cache_control(response, public=True,
+                            max_age=settings.SHORT_LINK_MAX_AGE)
+        return response
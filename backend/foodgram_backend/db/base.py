@@ -0,0 +1,108 @@
+"""PostgreSQL с управлением жизненным циклом соединений.
+
+Дополнительные ключи DATABASES:
+HEALTH_CHECKS - проверять постоянное соединение (CONN_MAX_AGE > 0)
+    перед первым запросом каждого HTTP-запроса;
+POOL - {'SIZE', 'TIMEOUT', 'MAX_LIFETIME'}: пул соединений процесса
+    для многопоточных воркеров, SIZE = 0 отключает пул.
+Счётчики соединений - foodgram_backend.db.pool.stats().
+"""
+from django.db.backends.postgresql import base
+
+from foodgram_backend.db import pool
+
+
+class ConnectionLifecycleMixin:
+    """Проверка, пул и счётчики соединений для любого бэкенда Django."""
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        self.health_check_done = False
+        options = settings_dict.get('POOL') or {}
+        self.pool = None
+        if options.get('SIZE'):
+            self.pool = pool.get_pool(
+                self.alias, options['SIZE'], options.get('TIMEOUT', 10),
+                options.get('MAX_LIFETIME', 3600)
+            )
+
+    def ping(self, connection):
+        """Исправно ли DB-API соединение, без открытой после проверки
+        транзакции."""
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+            connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
+
+    def open_connection(self, conn_params):
+        try:
+            connection = super().get_new_connection(conn_params)
+        except Exception:
+            pool.increment('failures')
+            raise
+        pool.increment('opens')
+        return connection
+
+    def get_new_connection(self, conn_params):
+        pool.increment('acquisitions')
+        if self.pool is None:
+            return self.open_connection(conn_params)
+        try:
+            return self.pool.acquire(
+                lambda: self.open_connection(conn_params), self.ping
+            )
+        except pool.PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        if self.connection is None:
+            return None
+        if self.pool is None:
+            pool.increment('closes')
+            return super()._close()
+        # Соединение внутри atomic остаётся у Django до отката, а после
+        # ошибки его состояние неизвестно: такие соединения закрываются.
+        if self.in_atomic_block or self.errors_occurred:
+            self.pool.discard(self.connection)
+            return None
+        try:
+            self.connection.rollback()
+        except self.Database.Error:
+            self.pool.discard(self.connection)
+        else:
+            self.pool.release(self.connection)
+        return None
+
+    def close_if_unusable_or_obsolete(self):
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        """Закрывает постоянное соединение, если база его разорвала.
+
+        Проверка выполняется один раз за HTTP-запрос и только вне
+        транзакции; соединения из пула проверяет сам пул.
+        """
+        if (self.connection is None or self.health_check_done
+                or self.pool is not None or self.in_atomic_block
+                or not self.get_autocommit()
+                or not self.settings_dict.get('HEALTH_CHECKS')):
+            return
+        self.health_check_done = True
+        if not self.ping(self.connection):
+            pool.increment('failures')
+            self.close()
+
+    def _cursor(self, *args, **kwargs):
+        self.close_if_health_check_failed()
+        return super()._cursor(*args, **kwargs)
+
+
+class DatabaseWrapper(ConnectionLifecycleMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import Counter
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def increment(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """Счётчики соединений процесса.
+
+    acquisitions - соединения, выданные Django; opens - открытые
+    физически; reuses - взятые из пула; waits - ожидания свободного
+    места в пуле; closes - закрытые физически; failures - ошибки
+    подключения, проверки и превышения времени ожидания пула.
+    """
+    with _stats_lock:
+        return {name: _stats[name] for name in (
+            'acquisitions', 'opens', 'reuses', 'waits', 'closes', 'failures'
+        )}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Пул DB-API соединений, общий для потоков процесса.
+
+    Не больше size соединений одновременно: выданных и простаивающих.
+    Простаивающие выдаются в порядке LIFO: первым берётся соединение,
+    которое использовалось последним.
+    """
+
+    def __init__(self, size, timeout, max_lifetime):
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._idle = []
+        self._opened_at = {}
+        # Открытые соединения вместе с открываемыми сейчас.
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, open_connection, is_usable):
+        """Соединение из пула, при необходимости новое от open_connection.
+
+        Простаивавшее соединение проверяется is_usable; при превышении
+        timeout ожидания выбрасывается PoolTimeout.
+        """
+        while True:
+            connection = self._take()
+            if connection is None:
+                try:
+                    connection = open_connection()
+                except Exception:
+                    self._forget(None)
+                    raise
+                with self._condition:
+                    self._opened_at[id(connection)] = time.monotonic()
+                return connection
+            if is_usable(connection):
+                increment('reuses')
+                return connection
+            increment('failures')
+            self.discard(connection)
+
+    def _take(self):
+        """Простаивающее соединение или None, если можно открыть новое."""
+        deadline = None
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._count < self.size:
+                    self._count += 1
+                    return None
+                if deadline is None:
+                    increment('waits')
+                    deadline = time.monotonic() + self.timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    increment('failures')
+                    raise PoolTimeout(
+                        f'Нет свободного соединения за {self.timeout} с.'
+                    )
+                self._condition.wait(remaining)
+
+    def _forget(self, connection):
+        with self._condition:
+            self._count -= 1
+            self._opened_at.pop(id(connection), None)
+            self._condition.notify()
+
+    def release(self, connection):
+        """Возвращает исправное соединение без открытой транзакции."""
+        opened_at = self._opened_at.get(id(connection))
+        if (opened_at is None
+                or time.monotonic() - opened_at >= self.max_lifetime):
+            self.discard(connection)
+            return
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        increment('closes')
+        self._forget(connection)
+
+
+def get_pool(alias, size, timeout, max_lifetime):
+    """Пул базы alias, один на процесс."""
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(size, timeout, max_lifetime)
+        return _pools[alias]
@@ -0,0 +1,90 @@
+"""Чтение из реплик для действий только на чтение.
+
+ReplicaMiddleware выбирает реплику для GET-запроса к действию из
+replica_actions класса представления, ReplicaRouter направляет в неё
+чтение. После успешной записи клиент с тем же заголовком Authorization
+DB_REPLICA_PIN_SECONDS секунд читает из основной базы и видит свои
+изменения, даже если реплика отстаёт.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_CACHE_KEY = 'replica_pin:{}'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+@contextmanager
+def use_primary():
+    """Чтение внутри блока идёт в основную базу.
+
+    Для заполнения кэшей, которые сбрасываются при записи: иначе после
+    сброса в кэш может попасть состояние отстающей реплики.
+    """
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def pin_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return PIN_CACHE_KEY.format(
+        hashlib.md5(authorization.encode()).hexdigest()
+    )
+
+
+class ReplicaRouter:
+    """Запись - в основную базу, чтение - в выбранную для запроса реплику."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.set(None)
+        key = pin_key(request)
+        if (key and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            cache.set(key, True, settings.DB_REPLICA_PIN_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or request.method not in SAFE_METHODS:
+            return None
+        method = request.method.lower()
+        # У ViewSet действие берётся из actions, у APIView - метод.
+        actions = getattr(view_func, 'actions', None)
+        action = actions.get(method) if actions else method
+        if action not in getattr(getattr(view_func, 'cls', None),
+                                 'replica_actions', ()):
+            return None
+        key = pin_key(request)
+        if key and cache.get(key):
+            return None
+        _read_alias.set(random.choice(replicas))
+        return None
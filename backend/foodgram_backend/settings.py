@@ -36,6 +36,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram_backend.db.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram_backend.urls'
@@ -60,21 +61,86 @@ WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 
 # Database
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.sqlite3',
-#         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
-# }
-
-DATABASES = {
+if os.getenv('DB_ENGINE', 'postgresql') == 'sqlite':
+    # SQLITE_NAME=:memory: - база в памяти, иначе путь к файлу.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
+            'TEST': {'NAME': os.getenv('SQLITE_TEST_NAME')},
+        }
+    }
+    # SQLITE_REPLICAS - пути к копиям базы через запятую.
+    for index, name in enumerate(
+        filter(None, os.getenv('SQLITE_REPLICAS', '').split(','))
+    ):
+        DATABASES[f'replica_{index}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': name,
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    # Соединения: постоянные (DB_CONN_MAX_AGE, с) с проверкой перед
+    # запросом или пул процесса для многопоточных воркеров (DB_POOL_SIZE).
+    # DB_POOLER=transaction - за PgBouncer в режиме транзакций: курсоры
+    # на стороне сервера не переживают транзакцию и отключаются.
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'foodgram_backend.db',
+            'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
+            'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', 5432),
+            # С пулом соединение возвращается в пул в конце запроса.
+            'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(
+                os.getenv('DB_CONN_MAX_AGE', 60)
+            ),
+            'HEALTH_CHECKS': os.getenv('DB_HEALTH_CHECKS', 'True') == 'True',
+            'POOL': {
+                'SIZE': DB_POOL_SIZE,
+                'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+            },
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.getenv('DB_POOLER', '') == 'transaction'
+            ),
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+    # DB_REPLICA_HOSTS - реплики через запятую: host или host:port.
+    for index, address in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))
+    ):
+        host, _, port = address.partition(':')
+        DATABASES[f'replica_{index}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'PORT': port or DATABASES['default']['PORT'],
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# Чтение из реплик для действий из replica_actions представлений.
+# После записи клиент DB_REPLICA_PIN_SECONDS секунд читает из основной базы.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['foodgram_backend.db.replicas.ReplicaRouter']
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+
+TEST_RUNNER = 'foodgram_backend.test_runner.TestRunner'
+
+# Кэш общий для процессов: через него воркеры и команды управления
+# сбрасывают индексы, кэш ответов и токены друг друга. LocMemCache по
+# умолчанию подходит только для одного процесса (тесты, runserver);
+# docker-compose задаёт memcached, manage.py check --deploy предупреждает.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
-        'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
-        'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
@@ -112,6 +178,9 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Наибольший размер изображения в base64 после декодирования, байт.
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 5 * 1024 * 1024))
+
 AUTH_USER_MODEL = 'users.User'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -122,7 +191,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PagePagination',
@@ -141,3 +210,23 @@ DJOSER = {
         'user': ['api.permissions.IsAuthenticatedOrAuthorOrReadOnly'],
     }
 }
+
+# Короткие ссылки
+
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10000))
+SHORT_LINK_CACHE_TTL = int(os.getenv('SHORT_LINK_CACHE_TTL', 60))
+SHORT_LINK_CACHE_TIMEOUT = int(os.getenv('SHORT_LINK_CACHE_TIMEOUT', 86400))
+SHORT_LINK_MAX_AGE = int(os.getenv('SHORT_LINK_MAX_AGE', 86400))
+
+# Кэш ответов API для анонимных пользователей, с.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 600))
+
+# Кэш токенов: размер и время жизни в процессе, время жизни в общем кэше, с.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 5))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+
+# Кэш процесса с изображениями, у которых уже есть варианты: размер и
+# время жизни, с.
+IMAGE_VARIANT_CACHE_SIZE = int(os.getenv('IMAGE_VARIANT_CACHE_SIZE', 10000))
+IMAGE_VARIANT_CACHE_TTL = int(os.getenv('IMAGE_VARIANT_CACHE_TTL', 300))
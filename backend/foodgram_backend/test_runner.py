@@ -0,0 +1,22 @@
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+# Вторая база SQLite для тестов чтения из реплик. Данные тестов
+# записываются только в основную базу: прочитанное из реплики видно
+# по пустым ответам.
+REPLICA_ALIAS = 'replica_test'
+REPLICA_DATABASE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': ':memory:',
+}
+
+
+class TestRunner(DiscoverRunner):
+    """Подключает REPLICA_ALIAS, только если его используют выбранные
+    тесты."""
+
+    def get_databases(self, suite):
+        if (REPLICA_ALIAS in self._get_databases(suite)
+                and REPLICA_ALIAS not in connections.databases):
+            connections.databases[REPLICA_ALIAS] = dict(REPLICA_DATABASE)
+        return super().get_databases(suite)
@@ -0,0 +1,464 @@
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from foodgram.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                             ShoppingList, ShoppingListIngredient, Tag)
+from api.authentication import local_cache as token_cache
+from foodgram import response_cache
+from foodgram.constant import MAX_INGREDIENT_SEARCH_RESULTS
+from foodgram.recipe_index import recipe_index
+from foodgram.short_links import local_cache
+from users.models import Subscriptions
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+# Множитель допустимого времени ответа для медленных машин и CI.
+LATENCY_FACTOR = float(os.getenv('PERF_LATENCY_FACTOR', 1))
+# Печатать замеры каждого запроса.
+PERF_REPORT = os.getenv('PERF_REPORT') == '1'
+
+USERS = 40
+RECIPES_PER_USER = 3
+INGREDIENTS = 300
+INGREDIENTS_PER_RECIPE = 8
+TAGS = 5
+FAVORITES_PER_USER = 12
+CART_PER_USER = 6
+SUBSCRIPTIONS_PER_USER = 10
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA'
+    'CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAA'
+    'AggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class APIPerformanceTest(APITestCase):
+    """Бюджет запросов к базе и времени ответа для каждого эндпоинта.
+
+    Число запросов не должно зависеть от размера страницы: появление
+    N+1 сразу ломает эти тесты.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(email=f'user{index}@example.com', username=f'user{index}',
+                 first_name='Имя', last_name='Фамилия')
+            for index in range(USERS)
+        )
+        users = list(User.objects.order_by('pk'))
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(TAGS)
+        )
+        tags = list(Tag.objects.order_by('pk'))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(INGREDIENTS)
+        )
+        ingredients = list(Ingredient.objects.order_by('pk'))
+        for index, user in enumerate(users):
+            for number in range(RECIPES_PER_USER):
+                Recipe.objects.create(
+                    author=user, name=f'Рецепт {index}-{number}',
+                    text='Описание', cooking_time=10
+                )
+        recipes = list(Recipe.objects.order_by('pk'))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tags[index % TAGS])
+            for index, recipe in enumerate(recipes)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(index * 7 + number) % INGREDIENTS],
+                amount=number + 1
+            )
+            for index, recipe in enumerate(recipes)
+            for number in range(INGREDIENTS_PER_RECIPE)
+        )
+        Favorites.objects.bulk_create(
+            Favorites(user=user, favorites=recipes[(index + number * 5)
+                                                   % len(recipes)])
+            for index, user in enumerate(users)
+            for number in range(FAVORITES_PER_USER)
+        )
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user=user, recipe=recipes[(index * 3 + number)
+                                                   % len(recipes)])
+            for index, user in enumerate(users)
+            for number in range(CART_PER_USER)
+        )
+        ShoppingListIngredient.objects.rebuild()
+        Subscriptions.objects.bulk_create(
+            Subscriptions(user=user, following=users[(index + number)
+                                                     % USERS])
+            for index, user in enumerate(users)
+            for number in range(1, SUBSCRIPTIONS_PER_USER + 1)
+        )
+        cls.user = users[0]
+        cls.other = users[-1]
+        cls.recipe = recipes[-1]
+        cls.own_recipe = cls.user.recipes.first()
+        cls.ingredients = ingredients
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        token_cache.clear()
+        self.anon = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertBudget(self, client, method, url, queries, latency_ms,
+                     data=None, status=200):
+        """Проверяет число запросов к базе и время ответа."""
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json')
+            content = (b''.join(response.streaming_content)
+                       if response.streaming else response.content)
+            elapsed = (time.perf_counter() - start) * 1000
+        if PERF_REPORT:
+            print(f'\n{method.upper()} {url}: {len(context)} запросов, '
+                  f'{elapsed:.1f} мс')
+        self.assertEqual(response.status_code, status, content)
+        executed = '\n'.join(query['sql'] for query in context)
+        self.assertLessEqual(
+            len(context), queries,
+            f'{method.upper()} {url}: {len(context)} запросов вместо '
+            f'{queries}:\n{executed}'
+        )
+        self.assertLess(elapsed, latency_ms * LATENCY_FACTOR,
+                        f'{method.upper()} {url}: {elapsed:.1f} мс')
+        return response
+
+    def assertPageInvariant(self, client, url, queries, latency_ms):
+        """Число запросов для маленькой и большой страницы одинаково."""
+        small = self.assertBudget(client, 'get', f'{url}limit=2',
+                                  queries, latency_ms)
+        large = self.assertBudget(client, 'get', f'{url}limit=50',
+                                  queries, latency_ms)
+        self.assertGreater(len(large.data['results']),
+                           len(small.data['results']))
+
+    def recipe_data(self, **kwargs):
+        data = {
+            'ingredients': [{'id': ingredient.id, 'amount': 10}
+                            for ingredient in self.ingredients[:10]],
+            'tags': [tag.id for tag in Tag.objects.all()[:2]],
+            'image': IMAGE,
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+        }
+        data.update(kwargs)
+        return data
+
+    def test_recipe_list(self):
+        self.assertPageInvariant(self.anon, '/api/recipes/?', 6, 300)
+        self.assertPageInvariant(self.client, '/api/recipes/?', 7, 300)
+
+    def test_recipe_list_filters(self):
+        self.assertPageInvariant(
+            self.client,
+            '/api/recipes/?is_favorited=1&is_in_shopping_cart=0'
+            '&tags=tag0&tags=tag1&', 9, 300
+        )
+
+    def test_recipe_search(self):
+        self.assertPageInvariant(
+            self.client, '/api/recipes/?search=%D1%80%D0%B5%D1%86%D0%B5%D0%BF'
+            '%D1%82&', 7, 300
+        )
+
+    def test_recipe_search_ranking(self):
+        relevant = Recipe.objects.create(
+            author=self.other, name='Борщ', text='Борщ с пампушками, борщ.',
+            cooking_time=60
+        )
+        newer = Recipe.objects.create(
+            author=self.other, name='Суп', text='Почти как борщ.',
+            cooking_time=30
+        )
+        response = self.client.get('/api/recipes/?search=борщ')
+        self.assertEqual([recipe['id'] for recipe in response.data['results']],
+                         [relevant.id, newer.id])
+        response = self.client.get('/api/recipes/?search=борщ&cursor=')
+        self.assertEqual([recipe['id'] for recipe in response.data['results']],
+                         [newer.id, relevant.id])
+
+    def test_recipe_list_cursor(self):
+        self.assertPageInvariant(self.client, '/api/recipes/?cursor=&',
+                                 6, 300)
+
+    def test_recipe_detail(self):
+        self.assertBudget(self.anon, 'get', f'/api/recipes/{self.recipe.id}/',
+                          5, 150)
+        self.assertBudget(self.client, 'get',
+                          f'/api/recipes/{self.recipe.id}/', 6, 150)
+
+    def test_recipe_not_modified(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        self.client.credentials(HTTP_IF_NONE_MATCH=etag)
+        self.assertBudget(self.client, 'get', url, 2, 100, status=304)
+
+    def test_author_change_updates_etag(self):
+        url = f'/api/recipes/{self.own_recipe.id}/'
+        etags = [client.get(url)['ETag'] for client in (self.client,
+                                                        self.anon)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/users/{self.user.id}/',
+                              {'first_name': 'Новое'}, format='json')
+        for client, etag in zip((self.client, self.anon), etags):
+            client.credentials(HTTP_IF_NONE_MATCH=etag)
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['author']['first_name'], 'Новое')
+
+    def test_recipe_create(self):
+        self.assertBudget(self.client, 'post', '/api/recipes/', 16, 400,
+                          data=self.recipe_data(), status=201)
+
+    def test_recipe_update(self):
+        self.assertBudget(
+            self.client, 'patch', f'/api/recipes/{self.own_recipe.id}/',
+            24, 400, data=self.recipe_data(), status=200
+        )
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        Favorites.objects.filter(user=self.user,
+                                 favorites=self.recipe).delete()
+        self.assertBudget(self.client, 'post', url, 5, 150, status=201)
+        self.assertBudget(self.client, 'delete', url, 3, 150, status=204)
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        ShoppingList.objects.filter(user=self.user,
+                                    recipe=self.recipe).delete()
+        self.assertBudget(self.client, 'post', url, 12, 150, status=201)
+        self.assertBudget(self.client, 'delete', url, 10, 150, status=204)
+
+    def test_duplicate_rejected_by_constraint(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        Favorites.objects.get_or_create(user=self.user, favorites=self.recipe)
+        response = self.assertBudget(self.client, 'post', url, 5, 150,
+                                     status=400)
+        self.assertEqual(response.data, {
+            'non_field_errors': ['Рецепт уже добавлен в избранное.']
+        })
+
+    def test_bulk_favorite(self):
+        ids = list(Recipe.objects.values_list('pk', flat=True)[:20])
+        Favorites.objects.filter(user=self.user).delete()
+        Favorites.objects.create(user=self.user, favorites_id=ids[0])
+        url = '/api/recipes/favorite/'
+        response = self.assertBudget(self.client, 'post', url, 4, 150,
+                                     data={'ids': ids + [0]})
+        statuses = [item['status'] for item in response.data['results']]
+        self.assertEqual(statuses,
+                         ['exists'] + ['created'] * 19 + ['not_found'])
+        self.assertEqual(self.user.favorites.count(), 20)
+        response = self.assertBudget(self.client, 'delete', url, 3, 150,
+                                     data={'ids': ids[:5] + [0]})
+        self.assertEqual(response.data['results'][-1]['status'], 'not_found')
+        self.assertEqual(self.user.favorites.count(), 15)
+        self.assertBudget(self.client, 'post', url, 0, 50,
+                          data={'ids': ['1']}, status=400)
+
+    def test_bulk_shopping_cart(self):
+        ids = list(Recipe.objects.values_list('pk', flat=True)[:20])
+        url = '/api/recipes/shopping_cart/'
+        self.assertBudget(self.client, 'post', url, 11, 200,
+                          data={'ids': ids})
+        self.assertBudget(self.client, 'delete', url, 11, 200,
+                          data={'ids': ids[:10]})
+        self.assertEqual(
+            set(ShoppingListIngredient.objects.filter(
+                user=self.user
+            ).values_list('user_id', 'ingredient_id', 'total_amount')),
+            set(ShoppingListIngredient.objects.live_totals([self.user.id]))
+        )
+
+    def test_bulk_subscribe(self):
+        ids = list(User.objects.values_list('pk', flat=True)[:10])
+        response = self.assertBudget(self.client, 'post',
+                                     '/api/users/subscribe/', 3, 150,
+                                     data={'ids': ids})
+        self.assertIn({'id': self.user.pk, 'status': 'invalid'},
+                      response.data['results'])
+        self.assertBudget(self.client, 'delete', '/api/users/subscribe/',
+                          3, 150, data={'ids': ids})
+        self.assertFalse(self.user.follower.filter(
+            following_id__in=ids
+        ).exists())
+
+    def test_download_shopping_cart(self):
+        for file_format in ('txt', 'csv', 'json'):
+            self.assertBudget(
+                self.client, 'get', '/api/recipes/download_shopping_cart/'
+                f'?file_format={file_format}', 2, 200
+            )
+
+    def test_subscriptions(self):
+        self.assertPageInvariant(
+            self.client, '/api/users/subscriptions/?recipes_limit=2&',
+            3, 300
+        )
+
+    def test_user_list(self):
+        self.assertPageInvariant(self.anon, '/api/users/?', 2, 200)
+        self.assertPageInvariant(self.client, '/api/users/?', 2, 200)
+
+    def test_user_me(self):
+        self.assertBudget(self.client, 'get', '/api/users/me/', 1, 100)
+
+    def test_token_authentication(self):
+        token = Token.objects.create(user=self.other)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertBudget(client, 'get', '/api/users/me/', 2, 100)
+        response = self.assertBudget(client, 'get', '/api/users/me/', 1, 50)
+        self.assertEqual(response.data['id'], self.other.id)
+        # Деактивация и выход сбрасывают кэш сразу.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.is_active = False
+            self.other.save()
+        self.assertBudget(client, 'get', '/api/users/me/', 1, 50,
+                          status=401)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.is_active = True
+            self.other.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/auth/token/logout/')
+        self.assertBudget(client, 'get', '/api/users/me/', 1, 50,
+                          status=401)
+
+    def test_malformed_token(self):
+        client = APIClient()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            for key in ('a' * 300, 'a\x01' * 20, 'A' * 40):
+                client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+                self.assertBudget(client, 'get', '/api/users/me/', 0, 50,
+                                  status=401)
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.other.id}/subscribe/'
+        Subscriptions.objects.filter(user=self.user,
+                                     following=self.other).delete()
+        self.assertBudget(self.client, 'post', url, 6, 150, status=201)
+        self.assertBudget(self.client, 'delete', url, 2, 150, status=204)
+
+    def test_ingredient_search(self):
+        url = '/api/ingredients/?name=%D0%B8%D0%BD%D0%B3'
+        self.assertBudget(self.anon, 'get', url, 1, 200)
+        self.assertBudget(self.anon, 'get', url, 0, 50)
+
+    def test_ingredient_empty_name(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'продукт {index}', measurement_unit='г')
+            for index in range(MAX_INGREDIENT_SEARCH_RESULTS)
+        )
+        count = Ingredient.objects.count()
+        for url in ('/api/ingredients/', '/api/ingredients/?name=',
+                    '/api/ingredients/?name=%20%20'):
+            response = self.assertBudget(self.anon, 'get', url, 1, 200)
+            self.assertEqual(len(response.data), count, url)
+
+    def test_anonymous_response_cache(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertBudget(self.anon, 'get', url, 5, 150)
+        response = self.assertBudget(self.anon, 'get', url, 0, 50)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.anon.credentials(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertBudget(self.anon, 'get', url, 0, 50, status=304)
+        self.anon.credentials()
+        tags_url = '/api/recipes/?tags=tag1&tags=tag0'
+        self.assertBudget(self.anon, 'get', tags_url, 9, 300)
+        self.assertBudget(self.anon, 'get',
+                          '/api/recipes/?page=1&tags=tag0&tags=tag1', 0, 50)
+        self.assertEqual(response_cache.stats(), {'hits': 3, 'misses': 2})
+        # Изменение рецепта сбрасывает его страницу и списки.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        response = self.assertBudget(self.anon, 'get', url, 5, 150)
+        self.assertEqual(response.data['name'], 'Новое название')
+        self.assertBudget(self.anon, 'get', tags_url, 9, 300)
+        # Авторизованный пользователь кэш не использует.
+        self.assertFalse(self.client.get(url).has_header('X-Cache'))
+
+    def test_what_can_i_cook(self):
+        ingredient_ids = list(self.own_recipe.recipeingredient.values_list(
+            'ingredient_id', flat=True
+        ))
+        query = '&'.join(f'ingredients={pk}' for pk in ingredient_ids)
+        url = f'/api/recipes/what_can_i_cook/?{query}&max_missing=8&'
+        recipe_index.build()
+        self.assertPageInvariant(self.anon, url, 1, 150)
+        first = self.anon.get(url).data['results'][0]
+        self.assertEqual(first['missing_count'], 0)
+        self.assertEqual(first['matched_count'], len(ingredient_ids))
+        # Индекс меняется только по изменённому рецепту.
+        self.own_recipe.recipeingredient.filter(
+            ingredient_id=ingredient_ids[0]
+        ).delete()
+        recipe_index.notify([self.own_recipe.pk])
+        recipes = recipe_index.search(ingredient_ids, 0)
+        self.assertIn((0, 1 - len(ingredient_ids), -self.own_recipe.pk),
+                      recipes[:len(recipes)])
+
+    def test_short_link(self):
+        url = f'/s/{self.recipe.uniq_code}/'
+        self.assertBudget(self.anon, 'get', url, 1, 100, status=301)
+        self.assertBudget(self.anon, 'get', url, 0, 50, status=301)
+
+    def test_short_link_invalid_code(self):
+        # Ключи, которые отверг бы memcached, LocMemCache только
+        # предупреждает: предупреждение превращается в ошибку.
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            for code in ('a%20b', 'a' * 300):
+                self.assertBudget(self.anon, 'get', f'/s/{code}/', 0, 50,
+                                  status=404)
+
+    def test_recipe_partial_update(self):
+        url = f'/api/recipes/{self.own_recipe.id}/'
+        rows = list(self.own_recipe.recipeingredient.values_list(
+            'pk', 'amount'
+        ).order_by('pk'))
+        tags = list(self.own_recipe.tags.values_list('pk', flat=True))
+        # Без ingredients и tags связанные строки не перезаписываются.
+        self.assertBudget(self.client, 'patch', url, 10, 200,
+                          data={'name': 'Исправленное название'})
+        self.assertEqual(rows, list(
+            self.own_recipe.recipeingredient.values_list(
+                'pk', 'amount'
+            ).order_by('pk')
+        ))
+        self.assertEqual(
+            tags, list(self.own_recipe.tags.values_list('pk', flat=True))
+        )
@@ -0,0 +1,64 @@
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+
+from foodgram import caching, response_cache
+from foodgram.checks import check_shared_cache
+
+
+def shared_caches():
+    return {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(),
+    }}
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+
+    def test_process_local_cache_warns(self):
+        self.assertEqual(
+            [warning.id for warning in check_shared_cache(None)],
+            ['foodgram.W001']
+        )
+
+    def test_shared_cache(self):
+        with override_settings(CACHES=shared_caches()):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class VersionCounterTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bump(self):
+        version = caching.get_version('test_version')
+        self.assertEqual(caching.bump_version('test_version'), version + 1)
+        self.assertEqual(caching.get_version('test_version'), version + 1)
+
+    def test_evicted_counter_does_not_repeat(self):
+        version = caching.bump_version('test_version')
+        cache.delete('test_version')
+        self.assertGreater(caching.get_version('test_version'), version)
+        cache.delete('test_version')
+        self.assertGreater(caching.bump_version('test_version'), version)
+
+
+class ResponseCacheStatsTest(SimpleTestCase):
+
+    def test_requires_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('response_cache_stats')
+
+    def test_stats(self):
+        with override_settings(CACHES=shared_caches()):
+            response_cache.count('hits')
+            response_cache.count('misses')
+            output = StringIO()
+            call_command('response_cache_stats', '--reset', stdout=output)
+            self.assertIn('Попаданий 1, промахов 1', output.getvalue())
+            self.assertEqual(response_cache.stats(),
+                             {'hits': 0, 'misses': 0})
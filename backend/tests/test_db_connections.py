@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+from django.test import SimpleTestCase
+
+from foodgram_backend.db import pool
+from foodgram_backend.db.base import ConnectionLifecycleMixin
+
+
+class DatabaseWrapper(ConnectionLifecycleMixin, base.DatabaseWrapper):
+    pass
+
+
+class ConnectionLifecycleTest(SimpleTestCase):
+    """Пул и проверки соединений на SQLite: логика не зависит от базы."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        pool.reset_stats()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def wrapper(self, **settings):
+        settings_dict = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(self.directory, 'db.sqlite3'),
+            'ATOMIC_REQUESTS': False, 'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': 0, 'OPTIONS': {}, 'TIME_ZONE': None,
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'TEST': {},
+        }
+        settings_dict.update(settings)
+        connection = DatabaseWrapper(settings_dict, alias=self.id())
+        self.addCleanup(connection.close)
+        return connection
+
+    def query(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()
+
+    def test_pool_reuses_connections(self):
+        first, second = (self.wrapper(POOL={'SIZE': 2}) for _ in range(2))
+        self.query(first)
+        first.close()
+        self.query(second)
+        self.assertEqual(pool.stats()['opens'], 1)
+        self.assertEqual(pool.stats()['reuses'], 1)
+        self.assertEqual(pool.stats()['acquisitions'], 2)
+
+    def test_pool_timeout(self):
+        options = {'SIZE': 1, 'TIMEOUT': 0.05}
+        first, second = (self.wrapper(POOL=options) for _ in range(2))
+        self.query(first)
+        with self.assertRaises(OperationalError):
+            self.query(second)
+        self.assertEqual(pool.stats()['waits'], 1)
+        self.assertEqual(pool.stats()['failures'], 1)
+        first.close()
+        self.assertEqual(self.query(second), (1, ))
+
+    def test_pool_discards_broken_connection(self):
+        first, second = (self.wrapper(POOL={'SIZE': 1}) for _ in range(2))
+        self.query(first)
+        raw = first.connection
+        first.close()
+        raw.close()
+        self.assertEqual(self.query(second), (1, ))
+        self.assertEqual(pool.stats()['opens'], 2)
+        self.assertEqual(pool.stats()['closes'], 1)
+
+    def test_health_check(self):
+        connection = self.wrapper(CONN_MAX_AGE=60, HEALTH_CHECKS=True)
+        self.query(connection)
+        # Соединение разорвано без ведома Django.
+        connection.connection.close()
+        connection.close_if_unusable_or_obsolete()
+        self.assertEqual(self.query(connection), (1, ))
+        self.assertEqual(pool.stats()['opens'], 2)
+        self.assertEqual(pool.stats()['failures'], 1)
+        # Повторная проверка в том же запросе не выполняется.
+        self.query(connection)
+        self.assertEqual(pool.stats()['failures'], 1)
@@ -0,0 +1,101 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from api.fields import Base64ImageField, ImageVariantsField
+from foodgram.image_variants import (AVATAR_VARIANTS, generate_variants,
+                                     ready_cache, variant_names)
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_file(image_format):
+    buffer = BytesIO()
+    Image.new('RGB', (300, 200), (200, 100, 50)).save(buffer, image_format)
+    return ContentFile(buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageVariantsTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        ready_cache.clear()
+        self.user = User.objects.create(email='user@example.com',
+                                        username='user')
+
+    def variants(self, name):
+        return [default_storage.exists(path)
+                for path in variant_names(name, AVATAR_VARIANTS).values()]
+
+    def set_avatar(self, user, image_format):
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar.save(f'temp.{image_format}',
+                             image_file(image_format))
+        return user.avatar.name
+
+    def test_names_keep_extension(self):
+        self.assertNotEqual(
+            set(variant_names('avatars/image/temp.png', AVATAR_VARIANTS)
+                .values()),
+            set(variant_names('avatars/image/temp.jpeg', AVATAR_VARIANTS)
+                .values()),
+        )
+
+    def test_replaced_avatar_variants_are_deleted(self):
+        user = User.objects.get(pk=self.user.pk)
+        old = self.set_avatar(user, 'png')
+        self.assertTrue(all(self.variants(old)))
+        user = User.objects.get(pk=self.user.pk)
+        new = self.set_avatar(user, 'jpeg')
+        self.assertFalse(any(self.variants(old)))
+        self.assertTrue(all(self.variants(new)))
+
+    def test_deleted_avatar_name_is_not_reused_with_variants(self):
+        user = User.objects.get(pk=self.user.pk)
+        name = self.set_avatar(user, 'png')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar.delete()
+        self.assertFalse(any(self.variants(name)))
+        other = User.objects.create(email='other@example.com',
+                                    username='other')
+        self.assertEqual(self.set_avatar(other, 'png'), name)
+        self.assertTrue(all(self.variants(name)))
+
+    def test_missing_variants_fall_back_to_original(self):
+        # Без captureOnCommitCallbacks варианты не создаются.
+        self.user.avatar.save('temp.png', image_file('png'))
+        field = ImageVariantsField(AVATAR_VARIANTS)
+        original = self.user.avatar.url
+        self.assertEqual(set(field.to_representation(self.user.avatar)
+                             .values()), {original})
+        generate_variants(self.user.avatar.name, AVATAR_VARIANTS)
+        urls = field.to_representation(self.user.avatar)
+        self.assertNotIn(original, urls.values())
+        self.assertEqual(len(urls), len(set(urls.values())))
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+
+    def test_line_wrapped_base64(self):
+        content = base64.encodebytes(image_file('png').read()).decode()
+        self.assertIn('\n', content)
+        for payload in (content, content.replace('\n', '\r\n')):
+            image = Base64ImageField().to_internal_value(
+                f'data:image/png;base64,{payload}'
+            )
+            with Image.open(image) as opened:
+                self.assertEqual(opened.size, (300, 200))
@@ -0,0 +1,59 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from foodgram.management.commands.load_ingredients import Command
+from foodgram.models import Ingredient
+
+
+class LoadIngredientsTest(TestCase):
+
+    def load(self, content, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False,
+                                         encoding='utf-8') as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        output = StringIO()
+        call_command('load_ingredients', '--file', file.name, *args,
+                     stdout=output, stderr=StringIO())
+        return output.getvalue()
+
+    def test_counts_inserted_rows(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        output = self.load('соль,г\nсахар,г\n')
+        self.assertIn('Прочитано 2, добавлено 1, исправлено 0, '
+                      'пропущено 0', output)
+
+    def test_conflicts_are_not_counted_as_created(self):
+        insert = Command.insert
+
+        def concurrent_insert(ingredients):
+            # Другой процесс успел добавить ту же строку.
+            Ingredient.objects.create(name='сахар', measurement_unit='г')
+            return insert(ingredients)
+
+        with mock.patch.object(Command, 'insert',
+                               staticmethod(concurrent_insert)):
+            output = self.load('сахар,г\nмука,г\n')
+        self.assertIn('добавлено 1, исправлено 0, пропущено 1', output)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_update_skips_ambiguous_names(self):
+        Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        Ingredient.objects.create(name='молоко', measurement_unit='г')
+        Ingredient.objects.create(name='соль', measurement_unit='кг')
+        output = self.load('молоко,л\nсоль,г\n', '--update')
+        self.assertIn('добавлено 0, исправлено 1, пропущено 1', output)
+        self.assertEqual(
+            sorted(Ingredient.objects.filter(
+                name='молоко'
+            ).values_list('measurement_unit', flat=True)),
+            ['г', 'мл']
+        )
+        self.assertTrue(Ingredient.objects.filter(
+            name='соль', measurement_unit='г'
+        ).exists())
@@ -0,0 +1,116 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+
+from api.filters import RecipeFilter
+from foodgram.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                             ShoppingList, ShoppingListIngredient, Tag)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+# Узлы плана, означающие полный просмотр таблицы или сортировку.
+SEQ_SCAN = {
+    'postgresql': re.compile(r'\bSeq Scan\b'),
+    'sqlite': re.compile(r'\bSCAN (TABLE )?\w+( AS \w+)?$', re.M),
+}
+SORT = {
+    'postgresql': re.compile(r'(^|->\s+)(Incremental )?Sort\b', re.M),
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (ORDER BY|RIGHT PART)'),
+}
+
+
+class QueryPlanTest(TestCase):
+    """Горячие запросы должны обслуживаться индексами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cook@example.com', username='cook', first_name='Повар',
+            last_name='Поваров', password='password'
+        )
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Авторов', password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание', cooking_time=5
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.recipe.tags.add(cls.tag)
+        ingredient = Ingredient.objects.create(name='соль',
+                                               measurement_unit='г')
+        RecipeIngredient.objects.create(recipe=cls.recipe,
+                                        ingredient=ingredient, amount=1)
+        Favorites.objects.create(user=cls.user, favorites=cls.recipe)
+        ShoppingList.objects.create(user=cls.user, recipe=cls.recipe)
+        Subscriptions.objects.create(user=cls.user, following=cls.author)
+
+    def setUp(self):
+        # В TestCase on_commit не выполняется: кэш тегов сбрасывается здесь.
+        cache.clear()
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик и так выберет Seq Scan,
+            # поэтому проверяется, что индексный план вообще возможен.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+        return queryset.explain()
+
+    def assertIndexed(self, queryset, allow_sort=False):
+        plan = self.explain(queryset)
+        if connection.vendor not in SEQ_SCAN:
+            self.skipTest(f'Нет правил для {connection.vendor}.')
+        self.assertIsNone(SEQ_SCAN[connection.vendor].search(plan),
+                          f'Полный просмотр таблицы:\n{plan}')
+        if not allow_sort:
+            self.assertIsNone(SORT[connection.vendor].search(plan),
+                              f'Сортировка без индекса:\n{plan}')
+
+    def test_recipe_feed(self):
+        self.assertIndexed(Recipe.objects.with_user_flags(self.user)[:6])
+
+    def test_author_recipes(self):
+        self.assertIndexed(Recipe.objects.filter(author=self.author)[:6])
+
+    def test_recipe_relations_prefetch(self):
+        self.assertIndexed(RecipeIngredient.objects.filter(
+            recipe__in=[self.recipe]
+        ))
+        self.assertIndexed(Recipe.tags.through.objects.filter(
+            recipe__in=[self.recipe]
+        ))
+
+    def test_reverse_lookups_by_recipe(self):
+        self.assertIndexed(Favorites.objects.filter(favorites=self.recipe))
+        self.assertIndexed(ShoppingList.objects.filter(recipe=self.recipe))
+
+    def test_subscribers(self):
+        self.assertIndexed(
+            Subscriptions.objects.filter(following=self.author)
+        )
+
+    def test_tag_filter(self):
+        for tags_match in ('any', 'all'):
+            with self.subTest(tags_match=tags_match):
+                filterset = RecipeFilter(
+                    {'tags': ['breakfast'], 'tags_match': tags_match},
+                    queryset=Recipe.objects.all()
+                )
+                self.assertTrue(filterset.is_valid(), filterset.errors)
+                self.assertIndexed(filterset.qs[:6])
+
+    def test_shopping_list(self):
+        # Сортировка по названию ингредиента неизбежна, но без полных
+        # просмотров таблиц.
+        self.assertIndexed(
+            ShoppingListIngredient.objects.filter(user=self.user).values(
+                'ingredient__name', 'total_amount'
+            ).order_by('ingredient__name'),
+            allow_sort=True
+        )
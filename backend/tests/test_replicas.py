@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from api.authentication import local_cache as token_cache
+from foodgram.models import Recipe, Tag
+from foodgram_backend.test_runner import REPLICA_ALIAS as REPLICA
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], DB_REPLICA_PIN_SECONDS=60)
+class ReplicaRoutingTest(APITestCase):
+    """Вторую базу SQLite подключает TestRunner."""
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='user@example.com',
+                                       username='user')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.recipe = Recipe.objects.create(author=cls.user, name='Каша',
+                                           text='Описание', cooking_time=10)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self, client, url, queries):
+        """Ответ на GET и число запросов к реплике."""
+        with CaptureQueriesContext(connections[REPLICA]) as context:
+            response = client.get(url)
+        self.assertEqual(len(context) > 0, queries, url)
+        return response
+
+    def test_read_only_actions_use_replica(self):
+        self.assertEqual(self.get(APIClient(), '/api/tags/', True).data, [])
+        response = self.get(self.client, '/api/recipes/', True)
+        self.assertEqual(response.data['count'], 0)
+        response = self.get(self.client, f'/api/recipes/{self.recipe.id}/',
+                            True)
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_actions_use_primary(self):
+        response = self.get(self.client, '/api/users/me/', False)
+        self.assertEqual(response.data['id'], self.user.id)
+        # Анонимный кэш ответов заполняется из основной базы.
+        response = self.get(APIClient(), '/api/recipes/', False)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_write_pins_client_to_primary(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        with CaptureQueriesContext(connections[REPLICA]) as context:
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(context), 0)
+        response = self.get(self.client, f'/api/recipes/{self.recipe.id}/',
+                            False)
+        self.assertTrue(response.data['is_favorited'])
+        # Другие клиенты по-прежнему читают из реплики.
+        other = Token.objects.create(
+            user=User.objects.create(email='other@example.com',
+                                     username='other')
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {other.key}')
+        self.get(client, '/api/recipes/', True)
+
+    @override_settings(DB_REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.get(self.client, '/api/recipes/', True)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        response = self.get(self.client, '/api/recipes/', False)
+        self.assertEqual(response.data['count'], 1)
@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from foodgram.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                             ShoppingList, ShoppingListIngredient)
+
+User = get_user_model()
+
+
+class ShoppingListTotalsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(email='user@example.com',
+                                       username='user')
+        cls.ingredient = Ingredient.objects.create(name='соль',
+                                                   measurement_unit='г')
+
+    def total(self):
+        return ShoppingListIngredient.objects.get(
+            user=self.user, ingredient=self.ingredient
+        ).total_amount
+
+    def test_add_row_inserted_concurrently(self):
+        # Строку вставила параллельная транзакция после select_for_update.
+        ShoppingListIngredient.objects.create(
+            user=self.user, ingredient=self.ingredient, total_amount=3
+        )
+        ShoppingListIngredient.objects.add(
+            [(self.user.id, self.ingredient.id, 5)]
+        )
+        self.assertEqual(self.total(), 8)
+
+    def test_apply(self):
+        manager = ShoppingListIngredient.objects
+        manager.apply([self.user.id], {self.ingredient.id: 5})
+        manager.apply([self.user.id], {self.ingredient.id: 2})
+        self.assertEqual(self.total(), 7)
+        manager.apply([self.user.id], {self.ingredient.id: -7})
+        self.assertFalse(manager.exists())
+
+
+class AdminCartTest(TestCase):
+    """Правка избранного и списков покупок в админке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='pass'
+        )
+        cls.user = User.objects.create(email='user@example.com',
+                                       username='user')
+        ingredient = Ingredient.objects.create(name='соль',
+                                               measurement_unit='г')
+        cls.recipe = Recipe.objects.create(author=cls.admin, name='Каша',
+                                           text='Описание', cooking_time=10)
+        RecipeIngredient.objects.create(recipe=cls.recipe,
+                                        ingredient=ingredient, amount=5)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def totals(self):
+        return list(ShoppingListIngredient.objects.filter(
+            user=self.user
+        ).values_list('total_amount', flat=True))
+
+    def updated_at(self):
+        return Recipe.objects.get(pk=self.recipe.pk).updated_at
+
+    def test_shopping_list(self):
+        updated_at = self.updated_at()
+        self.client.post('/admin/foodgram/shoppinglist/add/',
+                         {'user': self.user.pk, 'recipe': self.recipe.pk})
+        self.assertEqual(self.totals(), [5])
+        self.assertGreater(self.updated_at(), updated_at)
+        row = ShoppingList.objects.get(user=self.user)
+        self.client.post(f'/admin/foodgram/shoppinglist/{row.pk}/change/',
+                         {'user': self.admin.pk, 'recipe': self.recipe.pk})
+        self.assertEqual(self.totals(), [])
+        self.client.post('/admin/foodgram/shoppinglist/', {
+            'action': 'delete_selected', '_selected_action': [row.pk],
+            'post': 'yes',
+        })
+        self.assertFalse(ShoppingListIngredient.objects.exists())
+
+    def test_favorites(self):
+        updated_at = self.updated_at()
+        self.client.post('/admin/foodgram/favorites/add/',
+                         {'user': self.user.pk, 'favorites': self.recipe.pk})
+        self.assertTrue(Favorites.objects.exists())
+        self.assertGreater(self.updated_at(), updated_at)
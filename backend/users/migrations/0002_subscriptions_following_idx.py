@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-17 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscriptions',
+            index=models.Index(fields=['following', 'user'], name='subscriptions_following_idx'),
+        ),
+    ]
@@ -73,6 +73,10 @@ class Subscriptions(models.Model):
                 name='following_yourself'
             )
         ]
+        indexes = [
+            models.Index(fields=('following', 'user'),
+                         name='subscriptions_following_idx'),
+        ]
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
 